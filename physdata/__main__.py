@@ -0,0 +1,5 @@
+import sys
+
+from physdata.cli import main
+
+sys.exit(main())
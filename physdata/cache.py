@@ -0,0 +1,178 @@
+# -*- coding: UTF-8 -*-
+
+"""cache.py: A module to cache the pages downloaded from the NIST website.
+
+A :class:`Cache` is used by setting it in the scheduler of the package::
+
+    from physdata import scheduler
+    from physdata.cache import Cache
+
+    scheduler.configure(cache=Cache("~/.physdata"))
+
+Cached pages are served without any request. If a time to live is set, expired pages are downloaded again, but they
+are still used if the website cannot be reached before the deadline.
+
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+
+#: Directory of the cache used by the command line interface.
+DEFAULT_DIRECTORY = os.path.join("~", ".physdata", "cache")
+
+
+def cache_key(method, url, data=None):
+    """
+    Get the key identifying a request in the cache.
+
+    Args:
+        method (str): The HTTP method.
+        url (str): The url.
+        data (dict, optional): The form data sent.
+
+    Returns:
+        str: The key.
+
+    """
+    items = sorted((str(k), str(v)) for k, v in (data or {}).items())
+    return hashlib.sha1(json.dumps([method.upper(), url, items]).encode("utf-8")).hexdigest()
+
+
+class CachedResponse:
+    """
+    A page served from the cache, with the subset of the interface of :class:`requests.Response` used by the package.
+
+    Attributes:
+        text (str): The content of the page.
+        url (str): The url of the page.
+        status_code (int): Always 200.
+        encoding (str): Always "utf-8".
+        headers (dict): Always empty.
+
+    """
+
+    def __init__(self, text, url=None):
+        self.text = text
+        self.url = url
+        self.status_code = 200
+        self.encoding = "utf-8"
+        self.headers = {}
+
+    def __repr__(self):
+        return "CachedResponse<" + str(self.url) + ">"
+
+    @property
+    def content(self):
+        return self.text.encode("utf-8")
+
+    def iter_lines(self, decode_unicode=False, **kwargs):
+        for line in self.text.splitlines():
+            yield line if decode_unicode else line.encode("utf-8")
+
+    def close(self):
+        pass
+
+
+class Cache:
+    """
+    A thread-safe cache of pages, kept in memory and optionally in a directory.
+
+    Attributes:
+        directory (str): The directory where pages are stored, or None to keep them only in memory.
+        ttl (float): Time to live of the pages in seconds, or None if they never expire.
+
+    """
+
+    def __init__(self, directory=None, ttl=None):
+        """
+        Create a Cache.
+
+        Args:
+            directory (str, optional): A directory where pages are stored, so they persist between sessions and can be
+                                       shared between processes. It is created if needed.
+            ttl (float, optional): Time to live of the pages in seconds. By default, pages never expire.
+
+        """
+        self.directory = os.path.expanduser(directory) if directory else None
+        if self.directory and not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        self.ttl = ttl
+        self._memory = {}
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return "Cache<" + (self.directory or "memory") + ">"
+
+    def __len__(self):
+        return len(self._memory)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + ".json")
+
+    def get(self, key):
+        """
+        Get a page from the cache.
+
+        Args:
+            key (str): The key of the request, as returned by :func:`cache_key`.
+
+        Returns:
+            tuple: The content of the page and the time it was stored, or None if not found.
+
+        """
+        with self._lock:
+            entry = self._memory.get(key)
+        if entry is None and self.directory:
+            try:
+                with open(self._path(key)) as f:
+                    stored = json.load(f)
+                entry = (stored["text"], stored["time"])
+            except (IOError, OSError, ValueError, KeyError):
+                return None
+            with self._lock:
+                self._memory[key] = entry
+        return entry
+
+    def set(self, key, text):
+        """
+        Store a page in the cache.
+
+        Args:
+            key (str): The key of the request, as returned by :func:`cache_key`.
+            text (str): The content of the page.
+
+        """
+        entry = (text, time.time())
+        with self._lock:
+            self._memory[key] = entry
+        if self.directory:
+            path = self._path(key)
+            temporary = "%s.%d.%d" % (path, os.getpid(), threading.current_thread().ident)
+            with open(temporary, "w") as f:
+                json.dump({"text": text, "time": entry[1]}, f)
+            os.replace(temporary, path)  # Atomic, so concurrent readers never see a partial file
+
+    def is_fresh(self, stored_time):
+        """
+        Check if a page has not expired.
+
+        Args:
+            stored_time (float): The time the page was stored.
+
+        Returns:
+            bool: Whether the page can be used without downloading it again.
+
+        """
+        return self.ttl is None or time.time() - stored_time < self.ttl
+
+    def clear(self):
+        """Remove all the pages from the cache."""
+        with self._lock:
+            self._memory.clear()
+        if self.directory:
+            for name in os.listdir(self.directory):
+                if name.endswith(".json"):
+                    os.remove(os.path.join(self.directory, name))
@@ -0,0 +1,95 @@
+# -*- coding: UTF-8 -*-
+
+"""cli.py: The command line interface of the package.
+
+Usage::
+
+    physdata prefetch [--cache-dir DIR] [--no-elements] [--no-compounds] [--particles epa] [--workers N]
+    physdata serve [--host HOST] [--port PORT] [--cache-dir DIR] [--workers N]
+
+"""
+
+import argparse
+import sys
+
+from physdata import prefetch, scheduler, server
+from physdata.cache import Cache, DEFAULT_DIRECTORY
+
+
+def _prefetch(args):
+    scheduler.get_scheduler().cache = Cache(args.cache_dir)
+
+    def progress(completed, total, description):
+        print("[%d/%d] %s" % (completed, total, description), file=sys.stderr)
+
+    job = prefetch.prefetch(elements=args.elements, compounds=args.compounds, particles=tuple(args.particles),
+                            workers=args.workers, progress=None if args.quiet else progress)
+    try:
+        while not job.wait(0.5):
+            pass
+    except KeyboardInterrupt:
+        print("Cancelling, waiting for the downloads in progress...", file=sys.stderr)
+        job.cancel()
+        job.wait()
+        return 1
+    for description, error in job.failed:
+        print("Failed: %s (%s)" % (description, error), file=sys.stderr)
+    return 1 if job.failed else 0
+
+
+def _serve(args):
+    print("Serving at http://%s:%d" % (args.host, args.port), file=sys.stderr)
+    try:
+        server.serve(args.host, args.port, args.workers, Cache(args.cache_dir), quiet=args.quiet)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def main(argv=None):
+    """
+    Run the command line interface.
+
+    Args:
+        argv (List[str], optional): The arguments. By default, those of the command line.
+
+    Returns:
+        int: The exit status.
+
+    """
+    parser = argparse.ArgumentParser(prog="physdata", description="A python interface to some sources of physical data")
+    subparsers = parser.add_subparsers(dest="command")
+
+    parser_prefetch = subparsers.add_parser("prefetch", help="download the whole catalog to the cache")
+    parser_prefetch.add_argument("--cache-dir", default=DEFAULT_DIRECTORY,
+                                 help="directory of the cache (default: %(default)s)")
+    parser_prefetch.add_argument("--no-elements", dest="elements", action="store_false",
+                                 help="do not fetch the x-ray coefficients of the elements")
+    parser_prefetch.add_argument("--no-compounds", dest="compounds", action="store_false",
+                                 help="do not fetch the x-ray coefficients of the compounds")
+    parser_prefetch.add_argument("--particles", default="epa",
+                                 help="particles whose STAR tables are fetched (default: %(default)s)")
+    parser_prefetch.add_argument("--workers", type=int, default=4, help="concurrent downloads (default: %(default)s)")
+    parser_prefetch.add_argument("--quiet", action="store_true", help="do not report the progress")
+    parser_prefetch.set_defaults(function=_prefetch)
+
+    parser_serve = subparsers.add_parser("serve", help="run a local server sharing the data with other processes")
+    parser_serve.add_argument("--host", default="127.0.0.1", help="interface to listen on (default: %(default)s)")
+    parser_serve.add_argument("--port", type=int, default=server.DEFAULT_PORT,
+                              help="port to listen on (default: %(default)s)")
+    parser_serve.add_argument("--cache-dir", default=DEFAULT_DIRECTORY,
+                              help="directory of the cache (default: %(default)s)")
+    parser_serve.add_argument("--workers", type=int, default=4,
+                              help="materials of a batch fetched concurrently (default: %(default)s)")
+    parser_serve.add_argument("--quiet", action="store_true", help="do not log the requests")
+    parser_serve.set_defaults(function=_serve)
+
+    args = parser.parse_args(argv)
+    if args.command is None:
+        parser.print_help()
+        return 2
+    return args.function(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
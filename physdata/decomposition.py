@@ -0,0 +1,198 @@
+# -*- coding: UTF-8 -*-
+
+"""decomposition.py: A module for dual-energy basis-material decomposition of CT images, using the
+`X-Ray Mass Attenuation Coefficients <https://www.nist.gov/pml/x-ray-mass-attenuation-coefficients>`_ data.
+
+The linear attenuation coefficient measured in each pixel with two spectra is decomposed as the sum of the
+contributions of two basis materials, solving a 2x2 linear system for their partial densities. The attenuation of the
+basis materials is computed once for each spectrum, so the systems of all the pixels are solved at once with NumPy,
+optionally in chunks for images that do not fit in memory (e.g., :class:`numpy.memmap` arrays).
+
+Example:
+    Decompose a pair of images in water and cortical bone::
+
+        from physdata import decomposition, xray
+
+        compounds = {c.short_name: c for c in xray.fetch_compounds()}
+        decomposer = decomposition.DualEnergyDecomposition([compounds["water"], compounds["bone"]],
+                                                           (energies_80kv, weights_80kv),
+                                                           (energies_140kv, weights_140kv), effective_z=[7.42, 13.8])
+        maps = decomposer.maps(mu_80kv, mu_140kv, chunk_size=2 ** 20)
+
+"""
+
+import numpy as np
+
+from physdata.interpolation import coefficients_on_grid
+
+#: Avogadro constant in 1/mol.
+AVOGADRO = 6.02214076E23
+
+#: Exponent of the power law defining the effective atomic number.
+EFFECTIVE_Z_EXPONENT = 2.94
+
+
+def _effective_attenuation(material, spectrum):
+    # Mass attenuation coefficient averaged over a spectrum, given as (energies, weights) or as a single energy
+    if np.ndim(spectrum) == 0:
+        energies, weights = np.array([float(spectrum)]), np.ones(1)
+    else:
+        energies, weights = (np.asarray(x, dtype=float) for x in spectrum)
+    return coefficients_on_grid(material, energies, columns=1).dot(weights) / weights.sum()
+
+
+def _chunks(size, chunk_size):
+    if not chunk_size:
+        yield slice(0, size)
+        return
+    for start in range(0, size, chunk_size):
+        yield slice(start, min(start + chunk_size, size))
+
+
+class DualEnergyDecomposition:
+    """
+    A dual-energy decomposition in two basis materials for a pair of spectra.
+
+    Attributes:
+        basis (List): The two basis materials.
+        attenuation (numpy.ndarray): The mass attenuation coefficients in cm^2/g of the basis materials (columns) for
+                                     the low and high energy spectra (rows).
+        mass_ratios (numpy.ndarray): The Z/A ratio of each basis material.
+        effective_z (numpy.ndarray): The effective atomic number of each basis material, or None if unknown.
+
+    """
+
+    def __init__(self, basis, low_spectrum, high_spectrum, effective_z=None):
+        """
+        Create a DualEnergyDecomposition, computing the attenuation of the basis materials for both spectra.
+
+        Args:
+            basis (List): The two basis materials, as :obj:`physdata.xray.ElementData` or
+                          :obj:`physdata.xray.CompoundData` instances.
+            low_spectrum (tuple or float): The low energy spectrum, as a tuple with the energies in MeV and their
+                                           weights, or a single energy in MeV.
+            high_spectrum (tuple or float): The high energy spectrum, as the low energy one.
+            effective_z (List[float], optional): The effective atomic number of each basis material. By default, the
+                                                 atomic number is used for elements. Needed to compute effective atomic
+                                                 number maps with compounds.
+
+        """
+        if len(basis) != 2:
+            raise ValueError("two basis materials are needed")
+        self.basis = list(basis)
+        self.attenuation = np.array([[_effective_attenuation(m, spectrum) for m in self.basis]
+                                     for spectrum in (low_spectrum, high_spectrum)])
+        if abs(np.linalg.det(self.attenuation)) < 1E-12 * np.abs(self.attenuation).max() ** 2:
+            raise ValueError("the basis materials cannot be distinguished with these spectra")
+        self._inverse = np.linalg.inv(self.attenuation)
+        self.mass_ratios = np.array([m.mass_ratio for m in self.basis])
+        if effective_z is None and all(hasattr(m, "z") for m in self.basis):
+            effective_z = [m.z for m in self.basis]
+        self.effective_z = None if effective_z is None else np.asarray(effective_z, dtype=float)
+
+    def __repr__(self):
+        return "DualEnergyDecomposition<" + ", ".join(map(repr, self.basis)) + ">"
+
+    def decompose(self, low, high, chunk_size=None, out=None):
+        """
+        Decompose a pair of attenuation images in the partial densities of the basis materials.
+
+        Args:
+            low (array_like): The linear attenuation coefficients in cm^-1 measured with the low energy spectrum.
+            high (array_like): The linear attenuation coefficients in cm^-1 measured with the high energy spectrum,
+                               with the same shape.
+            chunk_size (int, optional): If given, the number of pixels processed at once.
+            out (array_like, optional): An array with shape (2,) + low.shape to store the result.
+
+        Returns:
+            numpy.ndarray: The partial density in g/cm^3 of each basis material, with shape (2,) + low.shape.
+
+        """
+        return self.maps(low, high, outputs=("densities",), chunk_size=chunk_size,
+                         out=None if out is None else {"densities": out})["densities"]
+
+    def electron_density(self, densities):
+        """
+        Compute the electron density from the partial densities of the basis materials.
+
+        Args:
+            densities (array_like): The partial densities, as returned by :meth:`decompose`.
+
+        Returns:
+            numpy.ndarray: The electron density in electrons/cm^3.
+
+        """
+        densities = np.asarray(densities, dtype=float)
+        return AVOGADRO * (self.mass_ratios[0] * densities[0] + self.mass_ratios[1] * densities[1])
+
+    def effective_atomic_number(self, densities, exponent=EFFECTIVE_Z_EXPONENT):
+        """
+        Compute the effective atomic number from the partial densities of the basis materials.
+
+        The effective atomic number is defined by the power law (sum_i f_i Z_i^m)^(1/m), with f_i the fraction of
+        electrons of each basis material. Pixels without electrons are set to NaN.
+
+        Args:
+            densities (array_like): The partial densities, as returned by :meth:`decompose`.
+            exponent (float): The exponent m of the power law.
+
+        Returns:
+            numpy.ndarray: The effective atomic number.
+
+        """
+        if self.effective_z is None:
+            raise ValueError("the effective atomic numbers of the basis materials are needed")
+        densities = np.asarray(densities, dtype=float)
+        electrons = self.mass_ratios[:, np.newaxis] * densities.reshape(2, -1)
+        total = electrons.sum(axis=0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            mean = (self.effective_z[:, np.newaxis] ** exponent * electrons).sum(axis=0) / total
+            z = np.where(total > 0, np.abs(mean) ** (1.0 / exponent), np.nan)
+        return z.reshape(densities.shape[1:])
+
+    def maps(self, low, high, outputs=("densities", "electron_density", "effective_z"), chunk_size=None, out=None):
+        """
+        Compute several maps from a pair of attenuation images.
+
+        Args:
+            low (array_like): The linear attenuation coefficients in cm^-1 measured with the low energy spectrum.
+            high (array_like): The linear attenuation coefficients in cm^-1 measured with the high energy spectrum.
+            outputs (tuple of str): The maps to compute, among "densities" (partial densities of the basis materials),
+                                    "electron_density" and "effective_z".
+            chunk_size (int, optional): If given, the number of pixels processed at once, so the intermediate arrays
+                                        are never larger than that.
+            out (dict, optional): Arrays where some of the maps are stored, with keys among the outputs. Missing ones
+                                  are allocated in memory.
+
+        Returns:
+            dict: The maps, by name. Densities have shape (2,) + low.shape, the other maps have the shape of the
+            images.
+
+        """
+        low = np.asarray(low)
+        high = np.asarray(high)
+        if low.shape != high.shape:
+            raise ValueError("both images must have the same shape")
+        shapes = {"densities": (2,) + low.shape, "electron_density": low.shape, "effective_z": low.shape}
+        out = dict(out or {})
+        for name in outputs:
+            if name not in shapes:
+                raise ValueError("unknown output: %s" % name)
+            if name not in out:
+                out[name] = np.empty(shapes[name])
+        # Flat views of the pixels
+        low_flat, high_flat = low.reshape(-1), high.reshape(-1)
+        flat = {name: out[name].reshape((2, -1) if name == "densities" else -1) for name in outputs}
+        for name in outputs:
+            if not np.may_share_memory(flat[name], out[name]):
+                raise ValueError("the array given to store %s must be contiguous" % name)
+        for chunk in _chunks(low_flat.size, chunk_size):
+            measured = np.stack([low_flat[chunk], high_flat[chunk]]).astype(float)
+            densities = self._inverse.dot(measured)
+            if "densities" in flat:
+                flat["densities"][:, chunk] = densities
+            if "electron_density" in flat:
+                flat["electron_density"][chunk] = self.electron_density(densities)
+            if "effective_z" in flat:
+                flat["effective_z"][chunk] = self.effective_atomic_number(densities)
+        return {name: out[name] for name in outputs}
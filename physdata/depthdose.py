@@ -0,0 +1,165 @@
+# -*- coding: UTF-8 -*-
+
+"""depthdose.py: A module to compute depth-dose curves (Bragg curves) of proton and alpha particle beams using the
+`PSTAR and ASTAR <https://www.nist.gov/pml/stopping-power-range-tables-electrons-protons-and-helium-ions>`_ tables.
+
+The continuous slowing down approximation is used along the beam axis: the residual energy at each depth is found by
+inverting the projected range (the CSDA range times the detour factor) of each layer, and the dose in each depth bin is
+the energy lost in it per unit mass thickness. Any number of beams are computed at once with NumPy.
+
+Example:
+    Bragg curves of 1000 proton beams in 1 cm of aluminium followed by water::
+
+        import numpy as np
+        from physdata import depthdose, star
+
+        layers = [(star.fetch_pstar(13), 2.6989, 1.0), (star.fetch_pstar(276), 1.0, 30.0)]
+        curves = depthdose.depth_dose(np.linspace(50, 200, 1000), layers, spread=1.0)
+        print(curves.peak_depths)
+
+"""
+
+import numpy as np
+
+from physdata.interpolation import loglog_interp
+
+
+class _LayerRanges:
+    # Projected range as a function of energy (and its inverse) of the material of a layer
+    def __init__(self, table, density, thickness):
+        data = np.asarray(table, dtype=float)
+        if data.ndim != 2 or data.shape[1] != 7:
+            raise ValueError("layers must be given with tables as returned by fetch_pstar or fetch_astar")
+        self.energies = data[:, 0]
+        # Projected range in g/cm^2, as the CSDA range times the detour factor
+        self.ranges = data[:, 4] * data[:, 6]
+        self.density = float(density)
+        self.thickness = float(thickness)
+
+    def projected_range(self, energies):
+        # Projected range in g/cm^2 of particles with some energies, scaling linearly below the tabulated ones
+        energies = np.asarray(energies, dtype=float)
+        output = np.zeros_like(energies)
+        low = energies < self.energies[0]
+        high = ~low
+        output[high] = loglog_interp(energies[high], self.energies, self.ranges)
+        output[low] = np.maximum(energies[low], 0) / self.energies[0] * self.ranges[0]
+        return output
+
+    def energy(self, ranges):
+        # Energy of particles with some residual projected ranges in g/cm^2 (0 if stopped)
+        ranges = np.asarray(ranges, dtype=float)
+        output = np.zeros_like(ranges)
+        high = ranges >= self.ranges[0]
+        low = (ranges > 0) & ~high
+        output[high] = loglog_interp(ranges[high], self.ranges, self.energies)
+        output[low] = ranges[low] / self.ranges[0] * self.energies[0]
+        return output
+
+
+class DepthDose:
+    """
+    Depth-dose curves of a set of beams.
+
+    Attributes:
+        edges (numpy.ndarray): The edges of the depth bins in cm.
+        depths (numpy.ndarray): The centers of the depth bins in cm.
+        dose (numpy.ndarray): The dose per unit fluence in each bin in MeV cm^2/g, with shape (number of beams, number
+                              of bins). Multiply by :data:`physdata.dosimetry.MEV_PER_G_TO_GY` to get Gy cm^2.
+        energies (numpy.ndarray): The mean kinetic energy in MeV at the edges of the bins, with shape (number of beams,
+                                  number of edges).
+        ranges (numpy.ndarray): The mean projected range of each beam in cm, that is, the mean depth where the particles
+                                stop.
+        peak_depths (numpy.ndarray): The depth of the Bragg peak of each beam in cm.
+
+    """
+
+    def __init__(self, edges, dose, energies, ranges):
+        self.edges = edges
+        self.depths = (edges[1:] + edges[:-1]) / 2
+        self.dose = dose
+        self.energies = energies
+        self.ranges = ranges
+        self.peak_depths = self._peak_depths()
+
+    def __repr__(self):
+        return "DepthDose<" + str(len(self.dose)) + " beams, " + str(len(self.depths)) + " bins>"
+
+    def _peak_depths(self):
+        # Maximum of each curve, refined with a parabola through the neighbouring bins (which may have different widths)
+        i = np.argmax(self.dose, axis=1)
+        if len(self.depths) < 3:
+            return self.depths[i]
+        j = np.clip(i, 1, len(self.depths) - 2)
+        rows = np.arange(len(self.dose))
+        x0, x1, x2 = self.depths[j - 1], self.depths[j], self.depths[j + 1]
+        y0, y1, y2 = self.dose[rows, j - 1], self.dose[rows, j], self.dose[rows, j + 1]
+        left, right = (y1 - y0) / (x1 - x0), (y2 - y1) / (x2 - x1)  # Slopes on each side
+        with np.errstate(divide="ignore", invalid="ignore"):
+            # Vertex of the parabola, between the midpoints where the slopes are taken, since y1 is the maximum
+            vertex = (x0 + x1) / 2 + left * (x2 - x0) / (2 * (left - right))
+        refined = (i == j) & (right < left)  # Only for a maximum inside the curve
+        return np.where(refined, vertex, self.depths[i])
+
+
+def depth_dose(energies, layers, edges=None, bins=1000, spread=None, nodes=7):
+    """
+    Compute the depth-dose curves of some beams in a stack of layers.
+
+    Args:
+        energies (array_like): The initial kinetic energies of the beams in MeV.
+        layers (List[tuple]): The layers in the order the beams cross them, each a tuple with the table of the material
+                              in mass units (as returned by :func:`physdata.star.fetch_pstar` or
+                              :func:`physdata.star.fetch_astar`), its density in g/cm^3 and its thickness in cm.
+                              The last layer is considered to extend beyond its thickness if the bins or the ranges
+                              of the beams do.
+        edges (array_like, optional): The increasing edges of the depth bins in cm. By default, the stack is divided in
+                                      equal bins.
+        bins (int): The number of bins if edges are not given.
+        spread (float or array_like, optional): The standard deviation of the (Gaussian) energy spread of the beams in
+                                                MeV, either the same for all or one for each beam.
+        nodes (int): The number of Gauss-Hermite nodes used to average over the energy spread.
+
+    Returns:
+        :obj:`DepthDose`: The depth-dose curves.
+
+    """
+    energies = np.atleast_1d(np.asarray(energies, dtype=float))
+    layers = [_LayerRanges(*layer) for layer in layers]
+    if edges is None:
+        edges = np.linspace(0, sum(layer.thickness for layer in layers), bins + 1)
+    edges = np.asarray(edges, dtype=float)
+
+    # Energy components of each beam, with shape (beams, nodes)
+    if spread is None or np.all(np.asarray(spread) == 0):
+        components = energies[:, np.newaxis]
+        weights = np.ones(1)
+    else:
+        x, weights = np.polynomial.hermite_e.hermegauss(nodes)
+        weights = weights / weights.sum()
+        spread = np.broadcast_to(np.asarray(spread, dtype=float), energies.shape)
+        components = np.maximum(energies[:, np.newaxis] + spread[:, np.newaxis] * x, 0.0)
+
+    # Walk the stack, finding the energy at the bin edges and where the particles stop
+    energy_at_edges = np.zeros(components.shape + edges.shape)
+    mass_depth = np.zeros(edges.shape)  # Mass thickness in g/cm^2 from the surface to each edge
+    stop_depths = np.full(components.shape, np.nan)
+    incoming = components
+    start = 0.0
+    for k, layer in enumerate(layers):
+        # The last layer is extended beyond its thickness
+        last = k == len(layers) - 1
+        thickness = np.inf if last else layer.thickness
+        inside = (edges >= start) & (edges < start + thickness)
+        crossed = np.minimum(np.maximum(edges - start, 0), thickness) * layer.density
+        mass_depth += crossed
+        residual = layer.projected_range(incoming)
+        energy_at_edges[..., inside] = layer.energy(residual[..., np.newaxis] - crossed[inside])
+        stops = np.isnan(stop_depths) & (residual <= thickness * layer.density)
+        stop_depths[stops] = start + residual[stops] / layer.density
+        if not last:
+            incoming = layer.energy(residual - layer.thickness * layer.density)
+            start += layer.thickness
+
+    dose = np.einsum("bnk,n->bk", -np.diff(energy_at_edges, axis=-1), weights) / np.diff(mass_depth)
+    return DepthDose(edges, dose, np.einsum("bnk,n->bk", energy_at_edges, weights), stop_depths.dot(weights))
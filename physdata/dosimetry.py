@@ -0,0 +1,150 @@
+# -*- coding: UTF-8 -*-
+
+"""dosimetry.py: A module to compute collision KERMA and absorbed dose from photon fluence spectra using the energy
+absorption coefficients of the `X-Ray Mass Attenuation Coefficients
+<https://www.nist.gov/pml/x-ray-mass-attenuation-coefficients>`_ data.
+
+The coefficients of each material are interpolated once on the energy grid of the spectra, so any number of spectra
+is then processed with a single matrix product.
+
+Example:
+    Air-to-water dose conversion factors for a batch of spectra::
+
+        import numpy as np
+        from physdata import dosimetry
+
+        energies = np.linspace(0.01, 0.15, 141)
+        spectra = np.random.rand(1000, len(energies))  # Fluence in each energy bin, in cm^-2
+        calculator = dosimetry.DoseCalculator(energies, ["air", "water"])
+        factors = calculator.conversion_factors(spectra, reference="air")[:, 1]
+
+"""
+
+import numpy as np
+
+from physdata.interpolation import coefficients_on_grid, trapezoid_weights
+
+#: Conversion factor from MeV/g to Gy.
+MEV_PER_G_TO_GY = 1.602176634E-10
+
+
+class DoseCalculator:
+    """
+    A collision KERMA calculator for a set of materials on a fixed energy grid.
+
+    The collision KERMA is the energy transferred to charged particles which is not radiated again. Under charged
+    particle equilibrium it equals the absorbed dose.
+
+    Attributes:
+        energies (numpy.ndarray): The energy grid of the spectra in MeV.
+        materials (List): The materials, as given on creation.
+        mu_en (numpy.ndarray): The mass energy absorption coefficients in cm^2/g interpolated on the grid, with shape
+                               (number of materials, number of energies).
+
+    """
+
+    def __init__(self, energies, materials, differential=False):
+        """
+        Create a DoseCalculator, interpolating the coefficients of each material on the energy grid.
+
+        Args:
+            energies (array_like): The increasing photon energies in MeV where spectra will be given.
+            materials (List): The materials. Each of them can be an :obj:`physdata.xray.ElementData`, a
+                :obj:`physdata.xray.CompoundData`, an atomic number, a compound name or an already fetched table in
+                mass units (as returned by :func:`physdata.xray.fetch_coefficient_table` or
+                :func:`physdata.xray.fetch_coefficients`).
+            differential (bool): If True, the spectra will be given as a fluence per unit energy (in cm^-2 MeV^-1)
+                                 and integrated with the trapezoidal rule. Otherwise, they are the fluence in each
+                                 energy bin (in cm^-2).
+
+        """
+        self.energies = np.asarray(energies, dtype=float)
+        if self.energies.ndim != 1:
+            raise ValueError("energies must be a 1D array")
+        self.materials = list(materials)
+        self.mu_en = np.array([coefficients_on_grid(m, self.energies, columns=2) for m in self.materials])
+        # Collision KERMA per unit fluence in each energy, in Gy cm^2
+        self._response = (self.mu_en * (self.energies * (trapezoid_weights(self.energies) if differential else 1.0))
+                          * MEV_PER_G_TO_GY)
+
+    def __repr__(self):
+        return "DoseCalculator<" + str(len(self.materials)) + " materials, " + str(len(self.energies)) + " energies>"
+
+    def _material_index(self, material):
+        # A material in the list (e.g., the atomic number 13) takes precedence over an index
+        for i, m in enumerate(self.materials):
+            if m is material or (isinstance(m, (int, str)) and type(m) is type(material) and m == material):
+                return i
+        if isinstance(material, (int, np.integer)) and not isinstance(material, bool):
+            if -len(self.materials) <= material < len(self.materials):
+                return int(material)
+        raise ValueError("unknown material: %r" % (material,))
+
+    def collision_kerma(self, fluence):
+        """
+        Compute the collision KERMA of each spectrum in each material.
+
+        Args:
+            fluence (array_like): The spectra, with shape (number of spectra, number of energies), or a single
+                                  spectrum.
+
+        Returns:
+            numpy.ndarray: The collision KERMA in Gy, with shape (number of spectra, number of materials), or
+            (number of materials,) if a single spectrum was given.
+
+        """
+        fluence = np.asarray(fluence, dtype=float)
+        if fluence.shape[-1] != len(self.energies):
+            raise ValueError("the last dimension of fluence must match the energy grid")
+        return fluence.dot(self._response.T)
+
+    def dose(self, fluence):
+        """
+        Compute the absorbed dose of each spectrum in each material, assuming charged particle equilibrium.
+
+        Args:
+            fluence (array_like): The spectra, as in :meth:`collision_kerma`.
+
+        Returns:
+            numpy.ndarray: The absorbed dose in Gy, as in :meth:`collision_kerma`.
+
+        """
+        return self.collision_kerma(fluence)
+
+    def conversion_factors(self, fluence, reference=0):
+        """
+        Compute the factors converting the dose in a reference material into the dose in each material.
+
+        Args:
+            fluence (array_like): The spectra, as in :meth:`collision_kerma`.
+            reference (int or object): The material itself as it was given in the materials list (e.g., "air" to
+                                       get air-to-material factors), or the index of the reference material. An
+                                       atomic number in the list is taken as that material, not as an index.
+
+        Returns:
+            numpy.ndarray: The ratios of the dose in each material to the dose in the reference one, as in
+            :meth:`collision_kerma`.
+
+        """
+        kerma = self.collision_kerma(fluence)
+        return kerma / kerma[..., self._material_index(reference), np.newaxis]
+
+
+def collision_kerma(energies, fluence, materials, differential=False):
+    """
+    Compute the collision KERMA of some spectra in some materials.
+
+    This is a shortcut for :meth:`DoseCalculator.collision_kerma`. Create a :obj:`DoseCalculator` to reuse the
+    interpolated coefficients.
+
+    Args:
+        energies (array_like): The increasing photon energies in MeV.
+        fluence (array_like): The spectra, with shape (number of spectra, number of energies), or a single spectrum.
+        materials (List): The materials, as in :obj:`DoseCalculator`.
+        differential (bool): Whether the fluence is given per unit energy, as in :obj:`DoseCalculator`.
+
+    Returns:
+        numpy.ndarray: The collision KERMA in Gy, with shape (number of spectra, number of materials).
+
+    """
+    return DoseCalculator(energies, materials, differential=differential).collision_kerma(fluence)
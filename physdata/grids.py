@@ -0,0 +1,178 @@
+# -*- coding: UTF-8 -*-
+
+"""grids.py: A module to share the energy grids of the fetched tables.
+
+Most tables use the same energies: every STAR table fetched with the default grid has the same kinetic energies, and
+the x-ray tables of the elements have most of their energies in common, only differing in those of their absorption
+edges. The fetch functions intern each energy of the website grids they parse, so all the tables reference the same
+float objects. Energies chosen by the user (e.g., the energies argument of the STAR functions) are not interned.
+
+Whole grids can also be interned as :class:`EnergyGrid` instances, which are shared by all the tables with the same
+energies and cache their NumPy version. The tables themselves are still lists of rows, so :func:`grid_of` builds the
+grid of a list each time it is called; :attr:`physdata.xray.CoefficientTable.grid` keeps it.
+
+The registry is bounded: once it holds :data:`MAX_POINTS` energies or :data:`MAX_GRIDS` grids, new values are returned
+without being stored, so long-running processes do not grow without limit.
+
+"""
+
+import threading
+
+#: Maximum number of energies kept by a registry.
+MAX_POINTS = 100000
+
+#: Maximum number of grids kept by a registry.
+MAX_GRIDS = 1000
+
+
+class EnergyGrid:
+    """
+    An immutable energy grid, shared by all the tables using it. Use :func:`intern_grid` to create instances.
+
+    Attributes:
+        values (tuple of float): The energies in MeV.
+
+    """
+
+    def __init__(self, values):
+        self.values = values
+        self._array = None
+
+    def __repr__(self):
+        return "EnergyGrid<" + str(len(self.values)) + " energies>"
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, item):
+        return self.values[item]
+
+    def __iter__(self):
+        return iter(self.values)
+
+    @property
+    def array(self):
+        """numpy.ndarray: A read-only NumPy array with the energies, created only once."""
+        if self._array is None:
+            import numpy as np
+            array = np.array(self.values, dtype=float)
+            array.flags.writeable = False
+            self._array = array
+        return self._array
+
+
+class GridRegistry:
+    """
+    A thread-safe registry of interned energies and grids.
+
+    Attributes:
+        max_points (int): Maximum number of energies kept. Once reached, new energies are not interned.
+        max_grids (int): Maximum number of grids kept. Once reached, new grids are not shared.
+
+    """
+
+    def __init__(self, max_points=MAX_POINTS, max_grids=MAX_GRIDS):
+        self.max_points = max_points
+        self.max_grids = max_grids
+        self._points = {}
+        self._grids = {}
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return "GridRegistry<" + str(len(self._grids)) + " grids, " + str(len(self._points)) + " energies>"
+
+    def __len__(self):
+        return len(self._grids)
+
+    def intern_point(self, value):
+        """
+        Get the shared float object for an energy.
+
+        Args:
+            value (float): The energy.
+
+        Returns:
+            float: An object equal to value, which is the same for every call with an equal value while the registry
+            is not full.
+
+        """
+        point = self._points.get(value)
+        if point is None:
+            with self._lock:
+                point = self._points.get(value)
+                if point is None:
+                    point = value
+                    if len(self._points) < self.max_points:
+                        self._points[value] = value
+        return point
+
+    def intern(self, values):
+        """
+        Get the shared grid with some energies.
+
+        Args:
+            values (iterable of float): The energies.
+
+        Returns:
+            :obj:`EnergyGrid`: A grid with those energies, which is the same for every call with equal energies while
+            the registry is not full.
+
+        """
+        values = tuple(self.intern_point(float(v)) for v in values)
+        grid = self._grids.get(values)
+        if grid is None:
+            with self._lock:
+                grid = self._grids.get(values)
+                if grid is None:
+                    grid = EnergyGrid(values)
+                    if len(self._grids) < self.max_grids:
+                        self._grids[values] = grid
+        return grid
+
+    def clear(self):
+        """Forget all the interned energies and grids. Existing tables keep their own references."""
+        with self._lock:
+            self._points.clear()
+            self._grids.clear()
+
+
+_registry = GridRegistry()
+
+
+def get_registry():
+    """
+    Get the registry used by the package.
+
+    Returns:
+        :obj:`GridRegistry`: The registry.
+
+    """
+    return _registry
+
+
+def intern_point(value):
+    """Get the shared float object for an energy. See :meth:`GridRegistry.intern_point`."""
+    return _registry.intern_point(value)
+
+
+def intern_grid(values):
+    """Get the shared grid with some energies. See :meth:`GridRegistry.intern`."""
+    return _registry.intern(values)
+
+
+def grid_of(table):
+    """
+    Get the shared energy grid of a table.
+
+    The grid is looked up from the energies of the rows in every call. Keep the result (or use a
+    :obj:`physdata.xray.CoefficientTable`, which does) to avoid repeating it.
+
+    Args:
+        table (List or :obj:`physdata.xray.CoefficientTable`): A table as returned by any of the fetch functions.
+
+    Returns:
+        :obj:`EnergyGrid`: The grid with the energies of the first column of the table.
+
+    """
+    rows = getattr(table, "rows", table)
+    return _registry.intern(row[0] for row in rows)
@@ -0,0 +1,148 @@
+# -*- coding: UTF-8 -*-
+
+"""interpolation.py: A module to evaluate the fetched tables on arbitrary energy grids using NumPy.
+
+Interpolation is linear in the logarithm of both the energy and the tabulated value, which is how the NIST tables are
+meant to be interpolated. X-ray tables are interpolated by segments, so values are never mixed across an absorption
+edge.
+
+"""
+
+import numpy as np
+
+from physdata.grids import EnergyGrid
+from physdata.lazy import LazyTable
+from physdata.xray import CoefficientTable, fetch_coefficient_table
+
+
+def _as_array(energies):
+    # Interned grids keep their own array
+    if isinstance(energies, EnergyGrid):
+        return energies.array
+    return np.asarray(energies, dtype=float)
+
+
+def loglog_interp(x, xp, fp):
+    """
+    Interpolate linearly in log-log scale.
+
+    Values outside the tabulated range are extrapolated using the first or last tabulated interval.
+
+    Args:
+        x (array_like): Points where the function is evaluated. Must be positive.
+        xp (array_like): Increasing tabulated points. Must be positive.
+        fp (array_like): Tabulated values, either with the same length as xp or with shape (len(xp), n) to interpolate
+                         n columns at once. Must be positive.
+
+    Returns:
+        numpy.ndarray: The interpolated values, with shape x.shape or x.shape + (n,).
+
+    """
+    x = np.log(_as_array(x))
+    xp = np.log(_as_array(xp))
+    fp = np.log(np.asarray(fp, dtype=float))
+    if len(xp) == 1:
+        return np.exp(np.broadcast_to(fp[0], x.shape + fp.shape[1:]))
+    i = np.clip(np.searchsorted(xp, x, side="right") - 1, 0, len(xp) - 2)
+    t = (x - xp[i]) / (xp[i + 1] - xp[i])
+    if fp.ndim > 1:
+        t = t[..., np.newaxis]
+    return np.exp(fp[i] + t * (fp[i + 1] - fp[i]))
+
+
+def trapezoid_weights(energies):
+    """
+    Get the weights integrating a function tabulated on a grid with the trapezoidal rule.
+
+    Args:
+        energies (array_like): The increasing points of the grid.
+
+    Returns:
+        numpy.ndarray: The weights, so the integral is the dot product of them and the values of the function.
+
+    """
+    energies = np.asarray(energies, dtype=float)
+    if len(energies) < 2:
+        raise ValueError("at least two points are needed to integrate")
+    widths = np.diff(energies)
+    weights = np.zeros_like(energies)
+    weights[:-1] += widths / 2
+    weights[1:] += widths / 2
+    return weights
+
+
+def coefficients_on_grid(table, energies, columns=(1, 2)):
+    """
+    Evaluate an x-ray coefficients table on some energies.
+
+    Args:
+        table (:obj:`CoefficientTable` or List): The table, as returned by :func:`physdata.xray.fetch_coefficient_table`
+            or by :func:`physdata.xray.fetch_coefficients`. A material (:obj:`physdata.xray.ElementData`,
+            :obj:`physdata.xray.CompoundData`, an atomic number or a compound name) can also be given to fetch its
+            table in mass units.
+        energies (array_like or :obj:`physdata.grids.EnergyGrid`): The energies in MeV.
+        columns (int or tuple of int): The column or columns of the table to evaluate. By default, both the attenuation
+                                       and the energy absorption coefficients.
+
+    Returns:
+        numpy.ndarray: The values with shape energies.shape (if columns is an int) or energies.shape + (len(columns),).
+
+    Note:
+        Absorption edges are found as repeated energies. In a table whose edges were split by a border separation,
+        the values are interpolated across that tiny interval instead. An energy exactly at an edge takes the value
+        above it.
+
+    """
+    energies = _as_array(energies)
+    table = _as_coefficient_table(table)
+    if isinstance(table, CoefficientTable):
+        data = np.asarray(table.rows, dtype=float)
+    else:
+        data = np.asarray(table, dtype=float)
+    values = data[:, columns]
+    # A new segment starts wherever the energy does not increase
+    starts = np.concatenate(([0], np.nonzero(np.diff(data[:, 0]) <= 0)[0] + 1))
+    stops = np.concatenate((starts[1:], [len(data)]))
+    if len(starts) == 1:
+        return loglog_interp(energies, data[:, 0], values)
+    # Segment of each energy, extrapolating the first and the last ones
+    segment = np.clip(np.searchsorted(data[starts[1:], 0], energies, side="right"), 0, len(starts) - 1)
+    output = np.empty(energies.shape + values.shape[1:])
+    for k, (start, stop) in enumerate(zip(starts, stops)):
+        mask = segment == k
+        if np.any(mask):
+            output[mask] = loglog_interp(energies[mask], data[start:stop, 0], values[start:stop])
+    return output
+
+
+def _as_coefficient_table(material):
+    # Accept an already fetched (or deferred) table, a material from the lists or an identifier to fetch
+    if isinstance(material, LazyTable):
+        return material.get()
+    if isinstance(material, (CoefficientTable, list, np.ndarray)):
+        return material
+    if hasattr(material, "get_coefficient_table"):
+        return material.get_coefficient_table()
+    return fetch_coefficient_table(material)
+
+
+def table_on_grid(table, energies, columns):
+    """
+    Evaluate a STAR table (or any table with increasing energies in its first column) on some energies.
+
+    Args:
+        table (List or array_like): The table, as returned by :func:`physdata.star.fetch_estar`,
+                                    :func:`physdata.star.fetch_pstar` or :func:`physdata.star.fetch_astar`.
+        energies (array_like or :obj:`physdata.grids.EnergyGrid`): The kinetic energies in MeV.
+        columns (int or tuple of int): The column or columns of the table to evaluate.
+
+    Returns:
+        numpy.ndarray: The values with shape energies.shape (if columns is an int) or energies.shape + (len(columns),).
+
+    """
+    data = np.asarray(table, dtype=float)
+    energies = _as_array(energies)
+    if energies.shape == data[:, 0].shape and np.array_equal(energies, data[:, 0]):
+        # Tables on the same grid (e.g., the default STAR grid) need no interpolation
+        return data[:, columns]
+    return loglog_interp(energies, data[:, 0], data[:, columns])
@@ -0,0 +1,207 @@
+# -*- coding: UTF-8 -*-
+
+"""lazy.py: A module to defer the fetch functions, so the pages needed by a loop are fetched together.
+
+In lazy mode, :func:`physdata.xray.fetch_coefficients` (and so the ``get_coefficients`` methods) and the STAR fetch
+functions return a :class:`LazyTable` at once instead of fetching the data. When the data of any handle is first
+accessed, or when :func:`resolve_all` is called, every pending fetch is made in a concurrent batch, fetching the same
+table only once.
+
+Example:
+    Fetch the coefficients of all the elements concurrently, without changing the loop::
+
+        from physdata import lazy, xray
+
+        with lazy.batch():
+            tables = {e.z: e.get_coefficients() for e in xray.fetch_elements()}
+        # All the tables were fetched together when the block exited
+
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from physdata import scheduler
+
+#: Maximum number of pending fetches resolved concurrently.
+LAZY_MAX_WORKERS = 8
+
+_local = threading.local()
+_pending = {}
+_pending_lock = threading.Lock()
+
+
+class LazyTable:
+    """
+    A handle to a table whose fetch is deferred until its data is needed. Use :func:`defer` to create instances.
+
+    The handle behaves as the list the fetch function returns: it can be indexed, iterated and converted to a NumPy
+    array. Any of those resolves all the pending fetches.
+
+    """
+
+    def __init__(self, function, args, kwargs):
+        self._function = function
+        self._args = args
+        self._kwargs = kwargs
+        self._value = None
+        self._error = None
+        self._done = threading.Event()
+
+    def __repr__(self):
+        call = ", ".join([repr(a) for a in self._args] + ["%s=%r" % item for item in sorted(self._kwargs.items())])
+        state = "resolved" if self.resolved else "pending"
+        return "LazyTable<" + self._function.__name__ + "(" + call + "), " + state + ">"
+
+    def _run(self):
+        try:
+            self._value = self._function(*self._args, **self._kwargs)
+        except Exception as e:
+            self._error = e
+        self._done.set()
+
+    @property
+    def resolved(self):
+        """bool: Whether the fetch has finished, either successfully or not."""
+        return self._done.is_set()
+
+    def get(self):
+        """
+        Get the table, resolving all the pending fetches if needed.
+
+        Returns:
+            The value returned by the fetch function.
+
+        Raises:
+            Exception: Any exception raised by the fetch function.
+
+        """
+        if not self._done.is_set():
+            resolve_all()
+            self._done.wait()  # If another thread took this fetch in its batch
+        if self._error is not None:
+            raise self._error
+        return self._value
+
+    def __len__(self):
+        return len(self.get())
+
+    def __getitem__(self, item):
+        return self.get()[item]
+
+    def __iter__(self):
+        return iter(self.get())
+
+    def __eq__(self, other):
+        return self.get() == (other.get() if isinstance(other, LazyTable) else other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    def __array__(self, dtype=None, copy=None):
+        import numpy as np
+        return np.asarray(self.get(), dtype=dtype)
+
+
+def is_enabled():
+    """
+    Check if the lazy mode is enabled in the current thread.
+
+    Returns:
+        bool: Whether the fetch functions return :class:`LazyTable` handles.
+
+    """
+    return getattr(_local, "enabled", False)
+
+
+def enable(enabled=True):
+    """
+    Enable or disable the lazy mode in the current thread.
+
+    Args:
+        enabled (bool): Whether the fetch functions return :class:`LazyTable` handles.
+
+    """
+    _local.enabled = enabled
+
+
+def disable():
+    """Disable the lazy mode in the current thread. Handles already created are still resolved when needed."""
+    enable(False)
+
+
+@contextmanager
+def batch():
+    """
+    Enable the lazy mode in the current thread inside a with block, resolving all the pending fetches when it exits.
+
+    """
+    previous = is_enabled()
+    enable()
+    try:
+        yield
+    finally:
+        enable(previous)
+    resolve_all()
+
+
+def defer(function, *args, **kwargs):
+    """
+    Defer a call to a fetch function.
+
+    Args:
+        function (callable): The fetch function.
+        *args: Its positional arguments.
+        **kwargs: Its keyword arguments.
+
+    Returns:
+        :obj:`LazyTable`: A handle to the result. While pending, the same handle is returned for the same call, so it
+        is fetched only once.
+
+    """
+    key = (function, args, tuple(sorted(kwargs.items())))
+    with _pending_lock:
+        table = _pending.get(key)
+        if table is None:
+            table = _pending[key] = LazyTable(function, args, kwargs)
+    return table
+
+
+def pending():
+    """
+    Get the number of pending fetches.
+
+    Returns:
+        int: The number of different calls deferred and not yet resolved.
+
+    """
+    return len(_pending)
+
+
+def resolve_all():
+    """
+    Resolve all the pending fetches in a concurrent batch.
+
+    Errors are not raised here, but when the data of the handle whose fetch failed is accessed.
+
+    Returns:
+        int: The number of fetches resolved.
+
+    """
+    with _pending_lock:
+        tables = list(_pending.values())
+        _pending.clear()
+    if not tables:
+        return 0
+    current = scheduler.current_deadline()  # Shared by all the fetches
+
+    def run(table):
+        with scheduler.deadline(current):
+            table._run()
+
+    with ThreadPoolExecutor(max_workers=max(1, min(LAZY_MAX_WORKERS, len(tables)))) as executor:
+        list(executor.map(run, tables))
+    return len(tables)
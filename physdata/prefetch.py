@@ -0,0 +1,149 @@
+# -*- coding: UTF-8 -*-
+
+"""prefetch.py: A module to warm up the cache with the whole catalog of the NIST website in the background.
+
+Example:
+    Start downloading everything while the program does something else::
+
+        from physdata import prefetch
+
+        job = prefetch.prefetch(progress=lambda done, total, task: print(done, "/", total))
+        ...  # Calls for materials already downloaded return at once, those in progress wait for their download
+        job.wait()
+
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from physdata import scheduler, star, xray
+from physdata.cache import Cache
+
+
+class Prefetch:
+    """
+    A prefetch running in the background. Use :func:`prefetch` to create instances.
+
+    Attributes:
+        total (int): The number of pages to fetch, or None while the lists of materials are still being fetched.
+        completed (int): The number of pages fetched (successfully or not).
+        failed (List[tuple]): The tasks that failed, each a tuple with a description and the exception raised.
+
+    """
+
+    def __init__(self, elements, compounds, particles, workers, progress):
+        self.total = None
+        self.completed = 0
+        self.failed = []
+        self._progress = progress
+        self._workers = workers
+        self._lock = threading.Lock()
+        self._cancelled = threading.Event()
+        self._finished = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(elements, compounds, particles))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def __repr__(self):
+        return "Prefetch<" + str(self.completed) + "/" + str(self.total) + ">"
+
+    def _tasks(self, elements, compounds, particles):
+        # The lists of materials are fetched one at a time, stopping as soon as the prefetch is cancelled
+        tasks = []
+        if elements and not self._cancelled.is_set():
+            tasks += [("xray %d" % e.z, xray.fetch_coefficients, (e.z,)) for e in xray.fetch_elements()]
+        if compounds and not self._cancelled.is_set():
+            tasks += [("xray " + c.short_name, xray.fetch_coefficients, (c.short_name,))
+                      for c in xray.fetch_compounds()]
+        fetchers = {"e": star.fetch_estar, "p": star.fetch_pstar, "a": star.fetch_astar}
+        for particle in particles:
+            if self._cancelled.is_set():
+                break
+            tasks += [("star %s %d" % (particle, el_id), fetchers[particle], (el_id,))
+                      for el_id, _ in star.fetch_star_materials(particle)]
+        return tasks
+
+    def _run_task(self, task):
+        description, function, args = task
+        if self._cancelled.is_set():
+            return
+        try:
+            function(*args)
+        except Exception as e:
+            self.failed.append((description, e))
+        with self._lock:
+            self.completed += 1
+            completed = self.completed
+        if self._progress is not None:
+            self._progress(completed, self.total, description)
+
+    def _run(self, elements, compounds, particles):
+        try:
+            tasks = self._tasks(elements, compounds, particles)
+            if self._cancelled.is_set():
+                return
+            self.total = len(tasks)
+            with ThreadPoolExecutor(max_workers=self._workers) as executor:
+                list(executor.map(self._run_task, tasks))
+        except Exception as e:
+            self.failed.append(("material lists", e))
+        finally:
+            self._finished.set()
+
+    @property
+    def done(self):
+        """bool: Whether the prefetch has finished, either completed or cancelled."""
+        return self._finished.is_set()
+
+    @property
+    def cancelled(self):
+        """bool: Whether the prefetch was cancelled."""
+        return self._cancelled.is_set()
+
+    def cancel(self):
+        """
+        Cancel the prefetch. Downloads in progress (including that of a list of materials) are finished, but no new
+        ones are started.
+
+        """
+        self._cancelled.set()
+
+    def wait(self, timeout=None):
+        """
+        Wait for the prefetch to finish.
+
+        Args:
+            timeout (float, optional): Maximum time to wait in seconds.
+
+        Returns:
+            bool: Whether the prefetch finished.
+
+        """
+        return self._finished.wait(timeout)
+
+
+def prefetch(elements=True, compounds=True, particles=("e", "p", "a"), workers=4, progress=None):
+    """
+    Fetch the whole catalog of the website in the background, storing it in the cache of the scheduler.
+
+    If the scheduler of the package has no cache, an in-memory one is set.
+
+    Args:
+        elements (bool): Whether to fetch the x-ray coefficients of the elements in
+                         :func:`physdata.xray.fetch_elements`.
+        compounds (bool): Whether to fetch the x-ray coefficients of the compounds in
+                          :func:`physdata.xray.fetch_compounds`.
+        particles (tuple of str): The particles whose STAR tables are fetched, for the materials in
+                                  :func:`physdata.star.fetch_star_materials`.
+        workers (int): Number of concurrent downloads. The rate is still limited by the scheduler.
+        progress (callable, optional): A function called after each page is fetched, with the number of pages fetched,
+                                       the total number of pages and a description of the last page.
+
+    Returns:
+        :obj:`Prefetch`: A handle to follow or cancel the prefetch.
+
+    """
+    s = scheduler.get_scheduler()
+    if s.cache is None:
+        s.cache = Cache()
+    return Prefetch(elements, compounds, tuple(particles), workers, progress)
@@ -0,0 +1,570 @@
+# -*- coding: UTF-8 -*-
+
+"""scheduler.py: A module to schedule the requests made to the NIST website.
+
+Every request of the package goes through a :class:`Scheduler`, which:
+
+* Limits the request rate with a token bucket. The bucket can be stored in a lock file, so several processes (e.g.,
+  the workers of a cluster sharing a file system) have a single budget.
+* Limits the number of concurrent requests to each host.
+* Detects throttling responses and retries them with exponential backoff and jitter.
+* Sets a timeout in every request, and an overall deadline for the requests made in a :func:`deadline` block.
+* Optionally hedges slow requests, firing a duplicate when one takes longer than a percentile of the recent latencies
+  and using whichever response arrives first. Duplicates are only fired when a token and a slot of the host are
+  available at once.
+* Serves pages from a :class:`physdata.cache.Cache`, if set, also falling back to expired pages when the website cannot
+  be reached in time. While a page is being downloaded, other threads asking for it wait for that download.
+* Optionally sends the requests through a local :mod:`physdata.server`, so a single process owns the traffic to the
+  website and its cache is shared by all the clients.
+
+Example:
+    Share a budget of 5 requests per second between all the processes of a job::
+
+        from physdata import scheduler
+
+        scheduler.configure(rate=5, burst=5, lock_file="/shared/physdata.lock")
+
+"""
+
+import random
+import threading
+import time
+import warnings
+from collections import deque
+from concurrent import futures
+from contextlib import contextmanager
+
+from urllib.parse import urlparse
+
+import requests
+
+from physdata.cache import CachedResponse, cache_key
+
+
+class RateLimitError(RuntimeError):
+    """The website kept throttling a request after all the retries."""
+    pass
+
+
+class DeadlineExceeded(RuntimeError):
+    """The deadline of a block of requests expired."""
+    pass
+
+
+class ServerError(requests.exceptions.RequestException):
+    """The :mod:`physdata.server` used as transport could not fetch a page."""
+    pass
+
+
+class Deadline:
+    """
+    A point in time after which no more requests should be made.
+
+    Attributes:
+        expires (float): The time of expiration, as given by :func:`time.time`.
+
+    """
+
+    def __init__(self, seconds):
+        """
+        Create a Deadline.
+
+        Args:
+            seconds (float): Seconds from now until the deadline expires.
+
+        """
+        self.expires = time.time() + seconds
+
+    def __repr__(self):
+        return "Deadline<" + str(self.remaining()) + " s>"
+
+    def remaining(self):
+        """
+        Get the time left.
+
+        Returns:
+            float: Seconds until the deadline expires, which is negative if it has already expired.
+
+        """
+        return self.expires - time.time()
+
+
+_local = threading.local()
+
+
+def current_deadline():
+    """
+    Get the deadline of the current thread.
+
+    Returns:
+        :obj:`Deadline`: The innermost deadline set with :func:`deadline`, or None.
+
+    """
+    return getattr(_local, "deadline", None)
+
+
+@contextmanager
+def deadline(seconds):
+    """
+    Set a deadline for all the requests made in the current thread inside a with block.
+
+    The timeout of each request is reduced so it does not exceed the deadline, and :class:`DeadlineExceeded` is raised
+    if a request is needed once it has expired. Nested deadlines can only make the current one shorter.
+
+    To share a deadline with the threads of a batch operation, pass them :func:`current_deadline` and open a block with
+    it in each thread.
+
+    Args:
+        seconds (float or :obj:`Deadline`): Seconds until the deadline expires, an existing deadline or None (no new
+                                           deadline).
+
+    """
+    previous = current_deadline()
+    new = seconds if seconds is None or isinstance(seconds, Deadline) else Deadline(seconds)
+    if new is None or (previous is not None and previous.expires <= new.expires):
+        new = previous
+    _local.deadline = new
+    try:
+        yield new
+    finally:
+        _local.deadline = previous
+
+
+def _close_response(future):
+    # Release the connection of a hedged request which lost the race
+    if future.exception() is None:
+        future.result().close()
+
+
+class TokenBucket:
+    """
+    A thread-safe token bucket, optionally shared between processes through a lock file.
+
+    Attributes:
+        rate (float): Tokens added per second.
+        burst (float): Maximum number of tokens stored.
+        lock_file (str): Path of the file storing the state of the bucket, or None to keep it in memory.
+
+    """
+
+    def __init__(self, rate, burst=1, lock_file=None):
+        """
+        Create a TokenBucket, initially full.
+
+        Args:
+            rate (float): Tokens added per second.
+            burst (float): Maximum number of tokens stored, that is, the number of requests that can be made at once.
+            lock_file (str, optional): Path of a file to store the state of the bucket, so it is shared with any other
+                                       bucket using the same file. Requires a platform with fcntl.
+
+        """
+        if rate <= 0 or burst < 1:
+            raise ValueError("rate must be positive and burst at least 1")
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.lock_file = lock_file
+        self._lock = threading.Lock()
+        self._tokens = self.burst
+        self._last = time.time()
+
+    def _take(self, tokens, last, now):
+        # Refill the bucket and try to take a token. Return the new state and the time to wait if none was available.
+        tokens = min(self.burst, tokens + max(0.0, now - last) * self.rate)
+        if tokens >= 1:
+            return tokens - 1, now, 0.0
+        return tokens, now, (1 - tokens) / self.rate
+
+    def _try_acquire(self):
+        with self._lock:
+            now = time.time()
+            if self.lock_file is None:
+                self._tokens, self._last, wait = self._take(self._tokens, self._last, now)
+                return wait
+            import fcntl
+            with open(self.lock_file, "a+") as f:
+                fcntl.flock(f, fcntl.LOCK_EX)  # Released when closed
+                f.seek(0)
+                state = f.read().split()
+                tokens, last = (float(state[0]), float(state[1])) if len(state) == 2 else (self.burst, now)
+                tokens, last, wait = self._take(tokens, last, now)
+                f.seek(0)
+                f.truncate()
+                f.write("%r %r" % (tokens, last))
+                f.flush()
+            return wait
+
+    def try_acquire(self):
+        """
+        Take a token from the bucket if one is available at once.
+
+        Returns:
+            bool: Whether a token was taken.
+
+        """
+        return self._try_acquire() <= 0
+
+    def acquire(self):
+        """Take a token from the bucket, waiting until one is available."""
+        while True:
+            wait = self._try_acquire()
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+
+class Scheduler:
+    """
+    A scheduler for the requests to the website.
+
+    Attributes:
+        bucket (:obj:`TokenBucket`): The rate limiter, or None if the rate is not limited.
+        max_per_host (int): Maximum number of concurrent requests to a host.
+        retries (int): Number of retries of a throttled or timed out request.
+        connection_retries (int): Number of retries of a request whose connection failed.
+        backoff (float): Base delay in seconds of the exponential backoff.
+        max_backoff (float): Maximum delay in seconds between retries.
+        throttle_statuses (tuple of int): HTTP status codes considered throttling.
+        timeout (float or tuple of float): Default timeout of each request in seconds.
+        hedge_percentile (float): Percentile of the latencies after which a request is hedged, or None not to hedge.
+        hedge_min_samples (int): Number of latencies that must be known before hedging requests to a host.
+        ssl_fallback (bool): Whether to retry without checking the certificate if it could not be verified.
+        cache (:obj:`physdata.cache.Cache`): The cache of the downloaded pages, or None.
+        server (str): The url of the :mod:`physdata.server` the requests are sent through, or None.
+        session (requests.Session): The session used, pooling the connections.
+
+    """
+
+    def __init__(self, rate=10.0, burst=10, max_per_host=4, lock_file=None, retries=5, backoff=1.0, max_backoff=60.0,
+                 throttle_statuses=(429, 503), timeout=(10.0, 60.0), hedge_percentile=None, hedge_min_samples=20,
+                 ssl_fallback=True, cache=None, server=None, connection_retries=0):
+        """
+        Create a Scheduler.
+
+        Args:
+            rate (float, optional): Maximum number of requests per second, or None not to limit it.
+            burst (int): Maximum number of requests made at once when enough budget has been saved.
+            max_per_host (int): Maximum number of concurrent requests to a host in this process.
+            lock_file (str, optional): Path of a lock file to share the rate budget between processes.
+            retries (int): Number of retries of a throttled or timed out request. Throttling reported by the server
+                           is not retried, since the server already applies this policy.
+            backoff (float): Base delay in seconds of the exponential backoff.
+            max_backoff (float): Maximum delay in seconds between retries.
+            throttle_statuses (tuple of int): HTTP status codes considered throttling.
+            timeout (float or tuple of float): Default timeout of each request in seconds, either a single value or a
+                                               (connect, read) tuple. None to wait forever.
+            hedge_percentile (float, optional): If given, a percentile (in (0, 100)) of the recent latencies of the
+                                                host after which a duplicate of a request is fired.
+            hedge_min_samples (int): Number of latencies that must be known before hedging requests to a host.
+            ssl_fallback (bool): Whether to retry without checking the certificate if it could not be verified.
+            cache (:obj:`physdata.cache.Cache`, optional): A cache of the downloaded pages.
+            server (str, optional): The url of a :mod:`physdata.server` (e.g., "http://127.0.0.1:8750") to send the
+                                    requests through instead of the website. The rate and the number of connections
+                                    are then limited by the server.
+            connection_retries (int): Number of retries of a request whose connection failed (e.g., the host could not
+                                      be resolved), within the limit of retries. By default, these failures are raised
+                                      at once, since they are rarely transient.
+
+        """
+        self.bucket = TokenBucket(rate, burst, lock_file) if rate else None
+        self.max_per_host = max_per_host
+        self.retries = retries
+        self.connection_retries = connection_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.throttle_statuses = tuple(throttle_statuses)
+        self.timeout = timeout
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.ssl_fallback = ssl_fallback
+        self.cache = cache
+        self.server = server.rstrip("/") if server else None
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=max_per_host)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._hosts = {}
+        self._latencies = {}
+        self._hosts_lock = threading.Lock()
+        self._executor = None
+        self._in_flight = {}
+
+    def __repr__(self):
+        rate = "unlimited" if self.bucket is None else str(self.bucket.rate) + "/s"
+        return "Scheduler<" + rate + ", " + str(self.max_per_host) + " per host>"
+
+    def _host_slots(self, url):
+        host = urlparse(url).netloc
+        with self._hosts_lock:
+            if host not in self._hosts:
+                self._hosts[host] = threading.BoundedSemaphore(self.max_per_host)
+                self._latencies[host] = deque(maxlen=200)
+            return self._hosts[host], self._latencies[host]
+
+    def _delay(self, attempt, response):
+        # Full jitter exponential backoff, but never retry before the server asked to
+        delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+        if response is not None:
+            try:
+                delay = max(delay, min(self.max_backoff, float(response.headers.get("Retry-After", 0))))
+            except ValueError:  # An HTTP date instead of seconds
+                pass
+        return delay
+
+    def _timeout(self, timeout, current):
+        # Reduce the timeout so the deadline is not exceeded
+        if current is None:
+            return timeout
+        remaining = current.remaining()
+        if remaining <= 0:
+            raise DeadlineExceeded("The deadline expired before the request could be made.")
+        if timeout is None:
+            return remaining
+        if isinstance(timeout, tuple):
+            return tuple(min(t, remaining) if t is not None else remaining for t in timeout)
+        return min(timeout, remaining)
+
+    def _send(self, method, url, kwargs, started=None):
+        # Wait for a slot of the host and a token, then make the request. started is set once they are acquired.
+        if self.server is not None:
+            return self._send_server(method, url, kwargs)
+        slots, latencies = self._host_slots(url)
+        with slots:
+            if self.bucket is not None:
+                self.bucket.acquire()
+            if started is not None:
+                started.set()
+            return self._transfer(method, url, kwargs, latencies)
+
+    def _send_duplicate(self, method, url, kwargs, slots, latencies):
+        # Make a hedged request, whose slot and token were already acquired
+        try:
+            return self._transfer(method, url, kwargs, latencies)
+        finally:
+            slots.release()
+
+    def _transfer(self, method, url, kwargs, latencies):
+        t = time.time()
+        try:
+            r = self.session.request(method, url, **kwargs)
+        except requests.exceptions.SSLError:
+            if not self.ssl_fallback:
+                raise
+            # If a certificate error occurred, ignore the certificate
+            kwargs = dict(kwargs, verify=False)
+            r = self.session.request(method, url, **kwargs)
+        latencies.append(time.time() - t)
+        return r
+
+    def _send_server(self, method, url, kwargs):
+        # Forward the request to the server, which answers with the page and the status code of the website
+        payload = {"method": method.upper(), "url": url, "data": kwargs.get("data")}
+        r = self.session.post(self.server + "/fetch", json=payload, timeout=kwargs.get("timeout"),
+                              stream=kwargs.get("stream", False))
+        if r.status_code in (400, 403, 502):
+            r.encoding = "utf-8"
+            message = r.text
+            r.close()
+            raise ServerError("The server could not fetch the page (HTTP %d): %s" % (r.status_code, message))
+        return r
+
+    def _hedge_threshold(self, url):
+        if self.hedge_percentile is None:
+            return None
+        latencies = sorted(self._host_slots(url)[1])
+        if len(latencies) < self.hedge_min_samples:
+            return None
+        return latencies[min(len(latencies) - 1, int(len(latencies) * self.hedge_percentile / 100.0))]
+
+    def _send_hedged(self, method, url, kwargs):
+        threshold = self._hedge_threshold(url)
+        if threshold is None:
+            return self._send(method, url, kwargs)
+        with self._hosts_lock:
+            if self._executor is None:
+                self._executor = futures.ThreadPoolExecutor(max_workers=2 * self.max_per_host)
+        # The latencies are measured once the request is sent, so the time waiting for the budget does not count
+        started = threading.Event()
+        first = self._executor.submit(self._send, method, url, kwargs, started)
+        first.add_done_callback(lambda f: started.set())
+        started.wait()
+        try:
+            return first.result(timeout=threshold)
+        except futures.TimeoutError:
+            pass
+        # Only hedge with spare capacity, so the duplicates never wait for (nor delay) other requests
+        slots, latencies = self._host_slots(url)
+        if not slots.acquire(blocking=False):
+            return first.result()
+        if self.bucket is not None and not self.bucket.try_acquire():
+            slots.release()
+            return first.result()
+        pending = {first, self._executor.submit(self._send_duplicate, method, url, kwargs, slots, latencies)}
+        error = None
+        while pending:
+            done, pending = futures.wait(pending, return_when=futures.FIRST_COMPLETED)
+            winners = [f for f in done if f.exception() is None]
+            if winners:
+                for f in winners[1:]:
+                    f.result().close()
+                for f in pending:
+                    f.add_done_callback(_close_response)
+                return winners[0].result()
+            error = next(iter(done)).exception()
+        raise error
+
+    def _request(self, method, url, kwargs):
+        current = current_deadline()
+        timeout = kwargs.pop("timeout", self.timeout)
+        r = None
+        connection_failures = 0
+        for attempt in range(self.retries + 1):
+            kwargs["timeout"] = self._timeout(timeout, current)
+            try:
+                r = self._send_hedged(method, url, kwargs)
+            except requests.exceptions.Timeout:  # Including connection timeouts
+                if attempt == self.retries:
+                    raise
+                r = None
+            except requests.exceptions.ConnectionError:
+                if attempt == self.retries or connection_failures == self.connection_retries:
+                    raise
+                connection_failures += 1
+                r = None
+            else:
+                if r.status_code not in self.throttle_statuses:
+                    return r
+                r.close()
+                if self.server is not None:
+                    break  # The server already retried with backoff
+            if attempt < self.retries:
+                delay = self._delay(attempt, r)
+                if current is not None and current.remaining() < delay:
+                    raise DeadlineExceeded("The deadline expired while retrying a request:\n%s" % url)
+                time.sleep(delay)
+        raise RateLimitError("The website is throttling the requests (HTTP %d):\n%s" % (r.status_code, url))
+
+    def request(self, method, url, **kwargs):
+        """
+        Make a request, waiting for the rate budget and retrying if throttled or timed out.
+
+        Args:
+            method (str): The HTTP method.
+            url (str): The url.
+            **kwargs: Any other argument accepted by :meth:`requests.Session.request`. If timeout is not given, the
+                      default one of the scheduler is used.
+
+        Returns:
+            requests.Response or :obj:`physdata.cache.CachedResponse`: The response.
+
+        Raises:
+            RateLimitError: If the request was still throttled after all the retries.
+            DeadlineExceeded: If the deadline of the thread expired.
+
+        """
+        key = cached = flight = None
+        if self.cache is not None:
+            key = cache_key(method, url, kwargs.get("data"))
+            cached = self.cache.get(key)
+            if cached is not None and self.cache.is_fresh(cached[1]):
+                return CachedResponse(cached[0], url)
+            text = self._wait_in_flight(key, cached)
+            if text is not None:
+                return CachedResponse(text, url)
+            with self._hosts_lock:
+                if key not in self._in_flight:
+                    flight = self._in_flight[key] = futures.Future()
+        text = None
+        try:
+            try:
+                r = self._request(method, url, kwargs)
+            except (RateLimitError, DeadlineExceeded, requests.exceptions.RequestException):
+                if cached is None:
+                    raise
+                warnings.warn("Using expired cached data, since the website could not be reached:\n%s" % url)
+                return CachedResponse(cached[0], url)
+            if key is not None and r.status_code == 200:
+                if r.encoding is None:
+                    r.encoding = "ISO-8859-1"
+                text = r.text
+                self.cache.set(key, text)
+            return r
+        finally:
+            if flight is not None:
+                with self._hosts_lock:
+                    del self._in_flight[key]
+                flight.set_result(text)
+
+    def _wait_in_flight(self, key, cached):
+        # If the same page is being downloaded by another thread, wait for it instead of making a duplicate request.
+        # Return the page or None if the other thread failed.
+        with self._hosts_lock:
+            flight = self._in_flight.get(key)
+        if flight is None:
+            return None
+        current = current_deadline()
+        try:
+            return flight.result(timeout=None if current is None else max(0, current.remaining()))
+        except futures.TimeoutError:
+            if cached is None:
+                raise DeadlineExceeded("The deadline expired while waiting for a request in progress.")
+            warnings.warn("Using expired cached data, since the request in progress did not finish in time.")
+            return cached[0]
+
+    def get(self, url, **kwargs):
+        """Make a GET request. See :meth:`request`."""
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        """Make a POST request. See :meth:`request`."""
+        return self.request("POST", url, **kwargs)
+
+
+_scheduler = Scheduler()
+
+
+def get_scheduler():
+    """
+    Get the scheduler used by the package.
+
+    Returns:
+        :obj:`Scheduler`: The scheduler.
+
+    """
+    return _scheduler
+
+
+def set_scheduler(scheduler):
+    """
+    Set the scheduler used by the package.
+
+    Args:
+        scheduler (:obj:`Scheduler`): The new scheduler.
+
+    """
+    global _scheduler
+    _scheduler = scheduler
+
+
+def configure(**kwargs):
+    """
+    Replace the scheduler used by the package by a new one.
+
+    Args:
+        **kwargs: The arguments of :class:`Scheduler`.
+
+    Returns:
+        :obj:`Scheduler`: The new scheduler.
+
+    """
+    set_scheduler(Scheduler(**kwargs))
+    return _scheduler
+
+
+def get(url, **kwargs):
+    """Make a GET request with the scheduler of the package. See :meth:`Scheduler.request`."""
+    return _scheduler.get(url, **kwargs)
+
+
+def post(url, **kwargs):
+    """Make a POST request with the scheduler of the package. See :meth:`Scheduler.request`."""
+    return _scheduler.post(url, **kwargs)
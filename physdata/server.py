@@ -0,0 +1,314 @@
+# -*- coding: UTF-8 -*-
+
+"""server.py: A local HTTP server sharing the data of the NIST website between many clients.
+
+A single process runs the server, which owns the cache and the traffic to the website. Other processes use it in two
+ways:
+
+* As the transport of the usual fetch functions, by setting the server in the scheduler::
+
+      from physdata import scheduler, xray
+
+      scheduler.configure(server="http://127.0.0.1:8750")
+      data = xray.fetch_coefficients(26)  # Served from the cache of the server
+
+* With a :class:`Client`, which fetches many materials in a single request and gets them as NumPy arrays::
+
+      from physdata.server import Client
+
+      tables = Client("http://127.0.0.1:8750").coefficients([1, 8, 26, "water"])
+
+The server is started with ``physdata serve`` or :func:`serve`. It listens on the loopback interface by default and only
+forwards requests to the NIST website.
+
+Endpoints:
+    * ``POST /fetch``: Fetch a page. The body is a JSON object with the method, url and form data of the request. The
+      page is returned with the status code of the website. If the website kept throttling the server after all its
+      retries, 429 is returned, which the clients raise as :class:`physdata.scheduler.RateLimitError` without retrying
+      again. Other failures are returned as 502.
+    * ``GET /elements`` and ``GET /compounds``: The lists of :func:`physdata.xray.fetch_elements` and
+      :func:`physdata.xray.fetch_compounds` as JSON.
+    * ``GET /coefficients?ids=1,26,water``: The tables of :func:`physdata.xray.fetch_coefficients` in mass units, as a
+      NumPy ``.npz`` file with an array for each id.
+    * ``GET /star?particle=e&ids=104,276&energies=0.1,1``: The tables of the STAR fetch functions in mass units, as a
+      NumPy ``.npz`` file. The energies are optional.
+
+"""
+
+import io
+import json
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import requests
+
+from physdata import scheduler, star, xray
+from physdata.cache import Cache
+
+#: Port used by default.
+DEFAULT_PORT = 8750
+
+#: Hosts the server forwards requests to.
+ALLOWED_HOSTS = ("physics.nist.gov",)
+
+_STAR_FETCHERS = {"e": star.fetch_estar, "p": star.fetch_pstar, "a": star.fetch_astar}
+
+
+def _parse_id(el_id):
+    # Materials are given by number (elements and STAR materials) or by short name (x-ray compounds)
+    return int(el_id) if el_id.isdigit() else el_id
+
+
+def _to_npz(tables):
+    output = io.BytesIO()
+    np.savez(output, **{str(k): np.asarray(v, dtype=float) for k, v in tables.items()})
+    return output.getvalue()
+
+
+def _from_npz(content, ids):
+    with np.load(io.BytesIO(content)) as arrays:
+        return {el_id: arrays[str(el_id)] for el_id in ids}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def _reply(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _error(self, status, message):
+        self._reply(status, message.encode("utf-8"), "text/plain; charset=utf-8")
+
+    def do_POST(self):
+        if urlparse(self.path).path != "/fetch":
+            return self._error(404, "Unknown endpoint: %s" % self.path)
+        try:
+            payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))).decode("utf-8"))
+            method, url, data = payload["method"], payload["url"], payload.get("data")
+        except (ValueError, KeyError, TypeError):
+            return self._error(400, "The body must be a JSON object with the method and url of the request.")
+        parsed = urlparse(url)
+        if parsed.scheme not in ("http", "https") or parsed.netloc not in self.server.allowed_hosts:
+            return self._error(403, "Only requests to %s are forwarded." % ", ".join(self.server.allowed_hosts))
+        try:
+            r = scheduler.get_scheduler().request(method, url, data=data)
+            if r.encoding is None:
+                r.encoding = "ISO-8859-1"
+            body = r.text.encode("utf-8")
+            status = r.status_code
+        except scheduler.RateLimitError as e:
+            # Reported as throttling. The retries were already made here, so the clients do not repeat them
+            return self._error(429, str(e))
+        except Exception as e:
+            return self._error(502, str(e))
+        self._reply(status, body, "text/html; charset=utf-8")
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        query = parse_qs(parsed.query)
+        ids = [_parse_id(el_id) for el_id in ",".join(query.get("ids", [])).split(",") if el_id]
+        try:
+            if parsed.path == "/elements":
+                rows = [[e.z, e.symbol, e.name, e.mass_ratio, e.excitation, e.density] for e in xray.fetch_elements()]
+                return self._reply(200, json.dumps(rows).encode("utf-8"), "application/json")
+            elif parsed.path == "/compounds":
+                rows = [[c.name, c.mass_ratio, c.excitation, c.density, c.short_name] for c in xray.fetch_compounds()]
+                return self._reply(200, json.dumps(rows).encode("utf-8"), "application/json")
+            elif parsed.path == "/coefficients":
+                tables = self.server.fetch_all(xray.fetch_coefficients, ids)
+            elif parsed.path == "/star":
+                particle = query.get("particle", ["e"])[0]
+                if particle not in _STAR_FETCHERS:
+                    return self._error(400, "particle must be either 'e', 'p' or 'a'.")
+                energies = [float(e) for e in ",".join(query.get("energies", [])).split(",") if e] or None
+                fetcher = _STAR_FETCHERS[particle]
+                tables = self.server.fetch_all(lambda el_id: fetcher(el_id, energies=energies), ids)
+            else:
+                return self._error(404, "Unknown endpoint: %s" % self.path)
+        except (ValueError, TypeError) as e:
+            return self._error(400, str(e))
+        except Exception as e:
+            return self._error(502, str(e))
+        self._reply(200, _to_npz(tables), "application/octet-stream")
+
+    def log_message(self, *args):
+        if not self.server.quiet:
+            BaseHTTPRequestHandler.log_message(self, *args)
+
+
+class DataServer(ThreadingMixIn, HTTPServer):
+    """
+    A threaded HTTP server sharing the data of the website. Use :meth:`serve_forever` to run it.
+
+    The pages are fetched with the scheduler of the package, so its rate limit and cache are shared by all the clients.
+
+    Attributes:
+        allowed_hosts (tuple of str): Hosts the server forwards requests to.
+        workers (int): Number of materials of a batch fetched concurrently.
+        quiet (bool): Whether to omit the log of the requests.
+
+    """
+
+    daemon_threads = True
+
+    def __init__(self, host="127.0.0.1", port=DEFAULT_PORT, workers=4, allowed_hosts=ALLOWED_HOSTS, quiet=True):
+        """
+        Create a DataServer, listening at once.
+
+        Args:
+            host (str): The interface to listen on. By default, only local clients are accepted.
+            port (int): The port to listen on. Use 0 to pick any free one.
+            workers (int): Number of materials of a batch fetched concurrently.
+            allowed_hosts (tuple of str): Hosts the server forwards requests to.
+            quiet (bool): Whether to omit the log of the requests.
+
+        """
+        HTTPServer.__init__(self, (host, port), _Handler)
+        self.workers = workers
+        self.allowed_hosts = tuple(allowed_hosts)
+        self.quiet = quiet
+
+    def __repr__(self):
+        return "DataServer<" + self.url + ">"
+
+    @property
+    def url(self):
+        """str: The url of the server, to be used by the clients."""
+        return "http://%s:%d" % self.server_address[:2]
+
+    def fetch_all(self, function, ids):
+        """
+        Fetch the tables of some materials concurrently.
+
+        Args:
+            function (callable): The fetch function, called with each id.
+            ids (List): The ids of the materials. Repeated ones are fetched once.
+
+        Returns:
+            dict: The tables, by id.
+
+        """
+        ids = list(dict.fromkeys(ids))
+        with ThreadPoolExecutor(max_workers=max(1, min(self.workers, len(ids)))) as executor:
+            return dict(zip(ids, executor.map(function, ids)))
+
+
+def serve(host="127.0.0.1", port=DEFAULT_PORT, workers=4, cache=None, quiet=True):
+    """
+    Run a :class:`DataServer` until interrupted.
+
+    Args:
+        host (str): The interface to listen on. By default, only local clients are accepted.
+        port (int): The port to listen on.
+        workers (int): Number of materials of a batch fetched concurrently.
+        cache (:obj:`physdata.cache.Cache`, optional): The cache of the server. By default, that of the scheduler of
+                                                       the package, or an in-memory one if it has none.
+        quiet (bool): Whether to omit the log of the requests.
+
+    """
+    s = scheduler.get_scheduler()
+    if cache is not None:
+        s.cache = cache
+    elif s.cache is None:
+        s.cache = Cache()
+    server = DataServer(host, port, workers, quiet=quiet)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+class Client:
+    """
+    A client of a :class:`DataServer`, fetching many materials in a single request.
+
+    Attributes:
+        url (str): The url of the server.
+        timeout (float): Timeout of each request in seconds, or None to wait forever.
+        session (requests.Session): The session used.
+
+    """
+
+    def __init__(self, url="http://127.0.0.1:%d" % DEFAULT_PORT, timeout=None):
+        """
+        Create a Client.
+
+        Args:
+            url (str): The url of the server.
+            timeout (float, optional): Timeout of each request in seconds. By default, wait as long as the server needs
+                                       to fetch the data from the website.
+
+        """
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def __repr__(self):
+        return "Client<" + self.url + ">"
+
+    def _get(self, path, params=None):
+        r = self.session.get(self.url + path, params=params, timeout=self.timeout)
+        if r.status_code != 200:
+            r.encoding = "utf-8"
+            raise RuntimeError("The server could not fetch the data (HTTP %d): %s" % (r.status_code, r.text))
+        return r
+
+    def elements(self):
+        """
+        Fetch the element data.
+
+        Returns:
+            List[:obj:`physdata.xray.ElementData`]: The same list as :func:`physdata.xray.fetch_elements`.
+
+        """
+        return [xray.ElementData(row) for row in self._get("/elements").json()]
+
+    def compounds(self):
+        """
+        Fetch the compound data.
+
+        Returns:
+            List[:obj:`physdata.xray.CompoundData`]: The same list as :func:`physdata.xray.fetch_compounds`.
+
+        """
+        return [xray.CompoundData(row[:4], row[4]) for row in self._get("/compounds").json()]
+
+    def coefficients(self, ids):
+        """
+        Fetch the x-ray coefficients of many materials.
+
+        Args:
+            ids (List[int or str]): The atomic numbers (elements) or short names (compounds) of the materials.
+
+        Returns:
+            dict: The tables in mass units by id, each a :class:`numpy.ndarray` with the columns of
+            :func:`physdata.xray.fetch_coefficients`.
+
+        """
+        ids = list(ids)
+        return _from_npz(self._get("/coefficients", {"ids": ",".join(map(str, ids))}).content, ids)
+
+    def star(self, ids, particle="e", energies=None):
+        """
+        Fetch the STAR tables of many materials.
+
+        Args:
+            ids (List[int]): The ids of the materials.
+            particle (str): Either 'e' (ESTAR), 'p' (PSTAR) or 'a' (ASTAR).
+            energies (List[float], optional): If given, the kinetic energies in MeV where the data is tabulated.
+
+        Returns:
+            dict: The tables in mass units by id, each a :class:`numpy.ndarray` with the columns of
+            :func:`physdata.star.fetch_estar`, :func:`physdata.star.fetch_pstar` or :func:`physdata.star.fetch_astar`.
+
+        """
+        ids = list(ids)
+        params = {"particle": particle, "ids": ",".join(map(str, ids))}
+        if energies is not None:
+            params["energies"] = ",".join(repr(float(e)) for e in energies)
+        return _from_npz(self._get("/star", params).content, ids)
@@ -0,0 +1,171 @@
+# -*- coding: UTF-8 -*-
+
+"""shared.py: A module to share fetched tables between processes.
+
+The tables are copied once into a :class:`multiprocessing.shared_memory.SharedMemory` block. Worker processes receive
+a small descriptor (which is cheap to pickle) and attach to the block, getting NumPy views of the tables without any
+copy. This module requires Python >= 3.8.
+
+Example:
+    Publish some tables in the main process and use them from a pool of workers::
+
+        from multiprocessing import Pool
+        from physdata import xray, shared
+
+        def work(descriptor):
+            with shared.attach(descriptor) as tables:
+                return tables[13][:, 1].max()
+
+        with shared.SharedTables({z: xray.fetch_coefficients(z) for z in range(1, 20)}) as published:
+            with Pool() as pool:
+                print(pool.map(work, [published.descriptor] * 4))
+
+"""
+
+import weakref
+from multiprocessing import shared_memory
+
+import numpy as np
+
+
+def _views(shm, index):
+    # Build read-only views of the tables described by index in the buffer of the block
+    views = {}
+    for key, (offset, shape) in index.items():
+        view = np.ndarray(shape, dtype=np.float64, buffer=shm.buf, offset=offset)
+        view.flags.writeable = False
+        views[key] = view
+    return views
+
+
+def _release(shm, unlink):
+    # Views still alive in user code prevent closing the mapping, but the block can be unlinked anyway
+    try:
+        shm.close()
+    except BufferError:
+        pass
+    if unlink:
+        try:
+            shm.unlink()
+        except FileNotFoundError:
+            pass
+
+
+class _TableSet:
+    def __init__(self, shm, index, unlink):
+        self._tables = _views(shm, index)
+        self.descriptor = {"name": shm.name, "tables": index}
+        self._finalizer = weakref.finalize(self, _release, shm, unlink)
+
+    def __getitem__(self, key):
+        return self._tables[key]
+
+    def __contains__(self, key):
+        return key in self._tables
+
+    def __iter__(self):
+        return iter(self._tables)
+
+    def __len__(self):
+        return len(self._tables)
+
+    def keys(self):
+        return self._tables.keys()
+
+    def items(self):
+        return self._tables.items()
+
+    def close(self):
+        """Release the shared memory block. The views obtained from this instance must not be used afterwards."""
+        self._tables = {}
+        self._finalizer()
+
+    @property
+    def closed(self):
+        return not self._finalizer.alive
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class SharedTables(_TableSet):
+    """
+    A set of tables published in shared memory by its owner process.
+
+    The instance behaves as a read-only mapping from the keys of the given tables to NumPy views. The block is unlinked
+    when :meth:`close` is called, when the instance is garbage collected or when the interpreter exits, whichever
+    happens first.
+
+    Attributes:
+        descriptor (dict): A picklable description of the block, to be used with :func:`attach` in other processes.
+
+    """
+
+    def __init__(self, tables):
+        """
+        Copy some tables into a new shared memory block.
+
+        Args:
+            tables (dict): A mapping from picklable keys to tables, as returned by the fetch functions (lists of rows
+                           of floats) or as 2D NumPy arrays.
+
+        """
+        arrays = {}
+        for key, table in tables.items():
+            array = np.asarray(table, dtype=np.float64)
+            if array.ndim != 2:
+                raise ValueError("table %r is not a 2D table" % (key,))
+            arrays[key] = array
+
+        shm = shared_memory.SharedMemory(create=True, size=max(1, sum(a.nbytes for a in arrays.values())))
+        index = {}
+        offset = 0
+        for key, array in arrays.items():
+            np.ndarray(array.shape, dtype=np.float64, buffer=shm.buf, offset=offset)[...] = array
+            index[key] = (offset, array.shape)
+            offset += array.nbytes
+        _TableSet.__init__(self, shm, index, unlink=True)
+
+    def __repr__(self):
+        return "SharedTables<" + self.descriptor["name"] + ">"
+
+
+class AttachedTables(_TableSet):
+    """
+    A set of tables attached from another process. Use :func:`attach` to create instances.
+
+    The views are read-only. Closing an instance only detaches it, the block is owned by the :class:`SharedTables`
+    that created it.
+
+    Attributes:
+        descriptor (dict): The descriptor used to attach the block.
+
+    """
+
+    def __init__(self, descriptor):
+        try:
+            # Python >= 3.13: attaching must not make the resource tracker of this process unlink the block
+            shm = shared_memory.SharedMemory(name=descriptor["name"], track=False)
+        except TypeError:
+            shm = shared_memory.SharedMemory(name=descriptor["name"])
+        _TableSet.__init__(self, shm, descriptor["tables"], unlink=False)
+
+    def __repr__(self):
+        return "AttachedTables<" + self.descriptor["name"] + ">"
+
+
+def attach(descriptor):
+    """
+    Attach to a set of tables published by :class:`SharedTables`, possibly in another process.
+
+    Args:
+        descriptor (dict): The descriptor attribute of the :class:`SharedTables` instance.
+
+    Returns:
+        :obj:`AttachedTables`: A read-only mapping from the keys of the tables to NumPy views on the shared block.
+
+    """
+    return AttachedTables(descriptor)
@@ -0,0 +1,189 @@
+# -*- coding: UTF-8 -*-
+
+"""shielding.py: A module to find the thickness of shielding materials needed to reach some transmission, using the
+`X-Ray Mass Attenuation Coefficients <https://www.nist.gov/pml/x-ray-mass-attenuation-coefficients>`_ data.
+
+The narrow beam transmission of a spectrum through a thickness t of a material is the weighted mean of exp(-mu t) over
+its energies, with mu the linear attenuation coefficient. It decreases monotonically with t, so the thickness giving a
+target transmission is bracketed by the values found with the largest and smallest mu of the spectrum. Inside that
+bracket, the logarithm of the transmission is convex, so Newton's method started at the thin end converges
+monotonically, without overshooting the root. The iterations advance every combination of material, spectrum and
+target together.
+
+Buildup of scattered photons is not considered.
+
+Example:
+    Thickness of lead, iron and concrete transmitting 10%, 1% and 0.1% of two spectra::
+
+        import numpy as np
+        from physdata import shielding, xray
+
+        elements = xray.fetch_elements()
+        compounds = {c.short_name: c for c in xray.fetch_compounds()}
+        energies = np.linspace(0.02, 0.15, 50)
+        solver = shielding.ShieldingSolver(energies, [elements[81], elements[25], compounds["concrete"]])
+        thicknesses = solver.thicknesses([0.1, 0.01, 0.001], weights=[spectrum_100kv, spectrum_150kv])
+
+"""
+
+import numpy as np
+
+from physdata.interpolation import coefficients_on_grid
+
+
+def _log_transmission(attenuation, log_weights, thicknesses):
+    # Logarithm of the transmission and mean attenuation of the transmitted photons, computed stably.
+    # attenuation and log_weights broadcast with thicknesses[..., np.newaxis]; the last axis is the energy.
+    exponents = log_weights - attenuation * thicknesses[..., np.newaxis]
+    peak = exponents.max(axis=-1, keepdims=True)
+    terms = np.exp(exponents - peak)
+    total = terms.sum(axis=-1)
+    return np.log(total) + peak[..., 0], (terms * attenuation).sum(axis=-1) / total
+
+
+class ShieldingSolver:
+    """
+    A solver of the shielding thickness of a set of materials on a fixed energy grid.
+
+    Attributes:
+        energies (numpy.ndarray): The photon energies in MeV.
+        materials (List): The materials, as given on creation.
+        densities (numpy.ndarray): The density of each material in g/cm^3.
+        attenuation (numpy.ndarray): The linear attenuation coefficients in cm^-1, with shape (number of materials,
+                                     number of energies).
+
+    """
+
+    def __init__(self, energies, materials, densities=None):
+        """
+        Create a ShieldingSolver, interpolating the attenuation of each material on the energy grid.
+
+        Args:
+            energies (array_like): The photon energies in MeV, either the grid of the spectra or monoenergetic lines.
+            materials (List): The materials, as :obj:`physdata.xray.ElementData` or :obj:`physdata.xray.CompoundData`
+                              instances, or any other value accepted by
+                              :func:`physdata.interpolation.coefficients_on_grid` if their densities are given.
+            densities (List[float], optional): The density of each material in g/cm^3. By default, the density
+                                               attribute of the materials.
+
+        """
+        self.energies = np.asarray(energies, dtype=float)
+        if self.energies.ndim != 1:
+            raise ValueError("energies must be a 1D array")
+        self.materials = list(materials)
+        if densities is None:
+            try:
+                densities = [m.density for m in self.materials]
+            except AttributeError:
+                raise ValueError("densities must be given for materials without a density attribute")
+        self.densities = np.asarray(densities, dtype=float)
+        if self.densities.shape != (len(self.materials),):
+            raise ValueError("a density is needed for each material")
+        self.attenuation = np.array([coefficients_on_grid(m, self.energies, columns=1) for m in self.materials])
+        self.attenuation *= self.densities[:, np.newaxis]
+
+    def __repr__(self):
+        return "ShieldingSolver<" + str(len(self.materials)) + " materials, " + str(len(self.energies)) + " energies>"
+
+    def _log_weights(self, weights):
+        # Spectra as logarithms of normalized weights, with shape (number of spectra, number of energies)
+        weights = np.atleast_2d(np.asarray(weights, dtype=float))
+        if weights.shape[-1] != len(self.energies):
+            raise ValueError("the last dimension of weights must match the energy grid")
+        if np.any(weights < 0) or np.any(weights.sum(axis=-1) <= 0):
+            raise ValueError("weights must be non-negative, with some positive value in each spectrum")
+        with np.errstate(divide="ignore"):
+            return np.log(weights / weights.sum(axis=-1, keepdims=True))
+
+    def transmission(self, thicknesses, weights=None):
+        """
+        Compute the transmission through some thicknesses of each material.
+
+        Args:
+            thicknesses (array_like): The thicknesses in cm.
+            weights (array_like, optional): The spectra, with shape (number of spectra, number of energies), or a single
+                                            one. Each is the weight of the energies in the quantity whose transmission
+                                            is computed (e.g., the photon fluence). If not given, each energy is
+                                            considered a monoenergetic line.
+
+        Returns:
+            numpy.ndarray: The transmission, with shape (number of materials, number of energies or spectra, number of
+            thicknesses), without the spectra axis if a single spectrum was given.
+
+        """
+        thicknesses = np.atleast_1d(np.asarray(thicknesses, dtype=float))
+        if weights is None:
+            return np.exp(-self.attenuation[:, :, np.newaxis] * thicknesses)
+        log_weights = self._log_weights(weights)
+        log_t, _ = _log_transmission(self.attenuation[:, np.newaxis, np.newaxis, :],
+                                     log_weights[np.newaxis, :, np.newaxis, :],
+                                     np.broadcast_to(thicknesses, (len(self.materials), len(log_weights),
+                                                                   len(thicknesses))))
+        output = np.exp(log_t)
+        return output[:, 0] if np.ndim(weights) == 1 else output
+
+    def thicknesses(self, targets, weights=None, tolerance=1E-10, max_iterations=100):
+        """
+        Find the thickness of each material giving some target transmissions.
+
+        Args:
+            targets (array_like): The target transmissions, in (0, 1].
+            weights (array_like, optional): The spectra, as in :meth:`transmission`. If not given, each energy is
+                                            considered a monoenergetic line.
+            tolerance (float): Relative tolerance of the thicknesses.
+            max_iterations (int): Maximum number of Newton iterations.
+
+        Returns:
+            numpy.ndarray: The thicknesses in cm, with shape (number of materials, number of energies or spectra,
+            number of targets), without the spectra axis if a single spectrum was given.
+
+        """
+        targets = np.atleast_1d(np.asarray(targets, dtype=float))
+        if np.any(targets <= 0) or np.any(targets > 1):
+            raise ValueError("targets must be in (0, 1]")
+        log_targets = np.log(targets)
+        if weights is None:
+            return -log_targets / self.attenuation[:, :, np.newaxis]
+        log_weights = self._log_weights(weights)
+        # Attenuation of the energies present in each spectrum, with shape (materials, spectra, 1, energies)
+        present = np.isfinite(log_weights)[np.newaxis, :, np.newaxis, :]
+        attenuation = self.attenuation[:, np.newaxis, np.newaxis, :]
+        log_weights = log_weights[np.newaxis, :, np.newaxis, :]
+        # Bracket from the extreme attenuations of each spectrum
+        mu_max = np.where(present, attenuation, -np.inf).max(axis=-1)
+        mu_min = np.where(present, attenuation, np.inf).min(axis=-1)
+        low = -log_targets / mu_max
+        high = -log_targets / mu_min
+        t = low
+        for _ in range(max_iterations):
+            log_t, mean = _log_transmission(attenuation, log_weights, t)
+            # Newton step on the convex, decreasing log-transmission, safeguarded to the bracket
+            new = np.clip(t + (log_t - log_targets) / mean, low, high)
+            converged = np.all(np.abs(new - t) <= tolerance * np.maximum(new, 1E-300))
+            t = new
+            if converged:
+                break
+        return t[:, 0] if np.ndim(weights) == 1 else t
+
+
+def shielding_thicknesses(energies, materials, targets, weights=None, densities=None):
+    """
+    Find the thickness of some materials giving some target transmissions.
+
+    Equivalent to ``ShieldingSolver(energies, materials, densities).thicknesses(targets, weights)``, which is
+    preferable when several sets of targets or spectra are studied with the same candidate materials.
+
+    Args:
+        energies (array_like): The photon energies in MeV.
+        materials (List): The materials, as in :obj:`ShieldingSolver`.
+        targets (array_like): The target transmissions, in (0, 1].
+        weights (array_like, optional): The spectra, as in :meth:`ShieldingSolver.transmission`. If not given, each
+                                        energy is considered a monoenergetic line.
+        densities (List[float], optional): The density of each material in g/cm^3. By default, the density attribute of
+                                           the materials.
+
+    Returns:
+        numpy.ndarray: The thicknesses in cm, as returned by :meth:`ShieldingSolver.thicknesses`.
+
+    """
+    return ShieldingSolver(energies, materials, densities).thicknesses(targets, weights)
@@ -6,13 +6,22 @@
 
 """
 
-import requests
 import re
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
 
 import warnings
 
+from physdata import grids, lazy, scheduler
 
-def fetch_estar(el_id, density=None):
+#: Maximum number of energies sent in a single request to the STAR forms. Longer lists are split in chunks.
+STAR_ENERGIES_PER_REQUEST = 100
+
+#: Maximum number of chunks of energies fetched concurrently.
+STAR_MAX_WORKERS = 4
+
+
+def fetch_estar(el_id, density=None, energies=None):
     """
     Fetch from the website the data for electrons in a medium.
 
@@ -22,6 +31,8 @@ def fetch_estar(el_id, density=None):
         el_id (int): The positive integer identifying the medium.
         density (float or bool, optional): If given, the density scaling is removed. If it is the boolean True, the
             density will be taken from the website.
+        energies (List[float], optional): If given, the increasing kinetic energies in MeV where the data is tabulated
+            instead of the default grid. Long lists are fetched in concurrent chunks.
 
     Returns:
         (list): a list of lists, a list with the data for each tabulated energy value, each a list with:
@@ -34,11 +45,13 @@ def fetch_estar(el_id, density=None):
             * (float): Radiation yield (fraction of kinetic energy converted into bremsstrahlung).
             * (float): Density effect parameter
 
+        In lazy mode (see :mod:`physdata.lazy`), a :obj:`physdata.lazy.LazyTable` with that list is returned instead.
+
     """
-    return _fetch_star(el_id, particle="e", density=density)
+    return _fetch_star(el_id, particle="e", density=density, energies=energies)
 
 
-def fetch_pstar(el_id, density=None):
+def fetch_pstar(el_id, density=None, energies=None):
     """
         Fetch from the website the data for protons in a medium.
 
@@ -48,6 +61,8 @@ def fetch_pstar(el_id, density=None):
             el_id (int): The positive integer identifying the medium.
             density (float or bool, optional): If given, the density scaling is removed. If it is the boolean True, the
             density will be taken from the website.
+            energies (List[float], optional): If given, the increasing kinetic energies in MeV where the data is
+                tabulated instead of the default grid. Long lists are fetched in concurrent chunks.
 
         Returns:
             (list): a list of lists, a list with the data for each tabulated energy value, each a list with:
@@ -60,11 +75,14 @@ def fetch_pstar(el_id, density=None):
                 * (float): Projected CSDA range in g/cm^2 or in cm if a density was given.
                 * (float): Detour factor (projected CSDA / CSDA).
 
+            In lazy mode (see :mod:`physdata.lazy`), a :obj:`physdata.lazy.LazyTable` with that list is returned
+            instead.
+
         """
-    return _fetch_star(el_id, particle="p", density=density)
+    return _fetch_star(el_id, particle="p", density=density, energies=energies)
 
 
-def fetch_astar(el_id, density=None):
+def fetch_astar(el_id, density=None, energies=None):
     """
         Fetch from the website the data for alpha particles in a medium.
 
@@ -74,6 +92,8 @@ def fetch_astar(el_id, density=None):
             el_id (int): The positive integer identifying the medium.
             density (float or bool, optional): If given, the density scaling is removed. If it is the boolean True, the
             density will be taken from the website.
+            energies (List[float], optional): If given, the increasing kinetic energies in MeV where the data is
+                tabulated instead of the default grid. Long lists are fetched in concurrent chunks.
 
         Returns:
             (list): a list of lists, a list with the data for each tabulated energy value, each a list with:
@@ -86,14 +106,106 @@ def fetch_astar(el_id, density=None):
                 * (float): Projected CSDA range in g/cm^2 or in cm if a density was given.
                 * (float): Detour factor (projected CSDA / CSDA).
 
+            In lazy mode (see :mod:`physdata.lazy`), a :obj:`physdata.lazy.LazyTable` with that list is returned
+            instead.
+
         """
-    return _fetch_star(el_id, particle="a", density=density)
+    return _fetch_star(el_id, particle="a", density=density, energies=energies)
+
+
+def fetch_star_materials(particle="e"):
+    """
+    Fetch the list of materials available for a particle from the website.
+
+    Args:
+        particle (str): The particle, either 'e' (electrons), 'p' (protons) or 'a' (alpha particles).
+
+    Returns:
+        List[tuple]: A list with the id (int) and the name (str) of each material available.
+
+    """
+    programs = {"e": "ESTAR", "p": "PSTAR", "a": "ASTAR"}
+    if particle not in programs:
+        raise TypeError("particle must be a string containing either 'e', 'p' or 'a'.")
+    url = "https://physics.nist.gov/PhysRefData/Star/Text/" + programs[particle] + ".html"
+    html = scheduler.get(url).text
+    # The materials are the options of the selection list in the form
+    options = re.findall(r'<option[^>]*value="?([0-9]+)"?[^>]*>\s*([^<\r\n]*)', html, re.IGNORECASE)
+    output = [(int(value), name.strip()) for value, name in options]
+    if not output:
+        warnings.warn("Empty list returned. Is the NIST page working?:\n%s" % url)
+    return output
+
+
+def iter_star(el_id, particle="e", density=None, energies=None):
+    """
+    Iterate over the data for a particle in a medium while it is downloaded from the website.
+
+    The rows are the same ones :func:`fetch_estar`, :func:`fetch_pstar` or :func:`fetch_astar` return, but they are
+    yielded as soon as they are parsed.
+
+    Args:
+        el_id (int): The positive integer identifying the medium.
+        particle (str): The particle, either 'e' (electrons), 'p' (protons) or 'a' (alpha particles).
+        density (float or bool, optional): If given, the density scaling is removed. If it is the boolean True, the
+            density will be taken from the website.
+        energies (List[float], optional): If given, the increasing kinetic energies in MeV where the data is tabulated
+            instead of the default grid. Long lists are fetched sequentially in chunks.
 
+    Returns:
+        Iterator[List]: An iterator over the rows of the table, whose content depends on the particle as described in
+        the fetch functions.
 
-def _fetch_star(el_id, particle="e", density=None):
+    """
+    z = _star_id(el_id)
+    url, data = _star_form(z, particle)
+    density = _check_density(density)
+    if energies is None:
+        return _iter_star_rows(z, particle, url, data, density)
+    if density is True and particle != "e":
+        density = _fetch_ap_density(z)
+    return chain.from_iterable(_iter_star_rows(z, particle, url, data, density)
+                               for data in _star_chunk_forms(z, particle, energies))
+
+
+def _fetch_star(el_id, particle="e", density=None, energies=None):
     # Note: 3 public functions are offered instead of this one  because the return of estar and pstar/astar is
     # different.
+    if lazy.is_enabled():
+        return lazy.defer(_fetch_star, el_id, particle, density, None if energies is None else tuple(energies))
+    z = _star_id(el_id)
+    url, data = _star_form(z, particle)
+    density = _check_density(density)
+    if energies is None:
+        output = list(_iter_star_rows(z, particle, url, data, density))
+    else:
+        if density is True and particle != "e":  # Read it once for all the chunks
+            density = _fetch_ap_density(z)
+        forms = _star_chunk_forms(z, particle, energies)
+        current = scheduler.current_deadline()  # Shared by all the chunks
+
+        def fetch_chunk(d):
+            with scheduler.deadline(current):
+                return list(_iter_star_rows(z, particle, url, d, density))
+
+        with ThreadPoolExecutor(max_workers=max(1, min(STAR_MAX_WORKERS, len(forms)))) as executor:
+            chunks = executor.map(fetch_chunk, forms)
+            # Merged in the order of the energies
+            output = list(chain.from_iterable(chunks))
+    if not output:
+        warnings.warn("Empty list returned. Is the NIST page working?:\n%s" % url)
+    return output
+
+
+def _check_density(density):
+    if type(density) is int:
+        return float(density)
+    elif density is not None and type(density) is not bool and (type(density) is not float or density == 0.0):
+        raise ValueError("density must be a non 0.0 float or a bool")
+    return density
+
 
+def _star_id(el_id):
     # el_id is a 3 character string in the website, so it has to converted.
     # Despite only int support is documented for el_id, also check for strings.
     if type(el_id) == int:
@@ -102,7 +214,10 @@ def _fetch_star(el_id, particle="e", density=None):
         raise TypeError("el_id must be either a positive integer or a string with a positive integer.")
     else:
         z = el_id
-    z = z.zfill(3)  # Ensure 3 digits
+    return z.zfill(3)  # Ensure 3 digits
+
+
+def _star_form(z, particle):
     if particle == "e":
         url = 'https://physics.nist.gov/cgi-bin/Star/e_table-t.pl'
         data = {"matno": z, "ShowDefault": "on"}
@@ -114,48 +229,71 @@ def _fetch_star(el_id, particle="e", density=None):
         data = {"matno": z, "ShowDefault": "on", "prog": "ASTAR"}
     else:
         raise TypeError("particle must be a string containing either 'e', 'p' or 'a'.")
-    try:
-        r = requests.post(url, data=data)
-    except requests.SSLERROR:  # If a certificate error occurred, ignore the certificate
-        r = requests.post(url, data=data, verify=False)
-
-    # TODO: Catch unexisting material
-    html = r.text
+    return url, data
+
+
+def _star_chunk_forms(z, particle, energies):
+    # Forms requesting the energies in chunks the website accepts
+    energies = [float(e) for e in energies]
+    if not energies or min(energies) <= 0:
+        raise ValueError("energies must be a non-empty list of positive values")
+    url, base = _star_form(z, particle)
+    del base["ShowDefault"]
+    forms = []
+    for i in range(0, len(energies), STAR_ENERGIES_PER_REQUEST):
+        data = dict(base)
+        data["Energies"] = "\n".join(repr(e) for e in energies[i:i + STAR_ENERGIES_PER_REQUEST])
+        forms.append(data)
+    return forms
+
+
+def _fetch_ap_density(z):
+    # Density for PSTAR and ASTAR materials is stored in a different page
     number_pattern = r'-?[0-9]+\.?[0-9]*E[-+][0-9]+'
+    html = scheduler.get('http://physics.nist.gov/cgi-bin/Star/compos.pl?ap-text' + z).text
+    return float(re.search(number_pattern, html).group(0))
 
-    if density is None:
-        density = 1.0
-    elif type(density) is bool:
-        if density:  # If density is True, read from html
-            if particle == "e":
-                # The first scientific number is the density
-                density = float(re.search(number_pattern, html).group(0))
-            else:
-                # Density is stored in a different page
-                html2 = requests.get('http://physics.nist.gov/cgi-bin/Star/compos.pl?ap-text' + z).text
-                density = float(re.search(number_pattern, html2).group(0))
-        else:  # If false, do not scale
-            density = 1.0
-    elif type(density) is int:
-        density = float(density)
-    elif type(density) is not float or density == 0.0:
-        raise ValueError("density must be a non 0.0 float or a bool")
-    output = []
 
-    # Find lines with seven numbers ending in <br>
-    # In e, all in scientific notation, in a and p the last one is a proper ratio (in (0, 1)).
-    if particle == "e":
-        lines = re.findall("(" + (number_pattern + "  ") * 6 + number_pattern + ")" + "<br>", html)
-        unit_scale = [1.0, density, density, density, 1 / density, 1.0, 1.0]
-    else:  # p or a
-        lines = re.findall("(" + (number_pattern + "  ") * 6 + "0.[0-9]+" + ")" + "<br>", html)
-        unit_scale = [1.0, density, density, density, 1 / density, 1 / density, 1]
+def _iter_star_rows(z, particle, url, data, density):
+    r = scheduler.post(url, data=data, stream=True)
+    if r.encoding is None:
+        r.encoding = "ISO-8859-1"
+    try:  # Release the connection even if the rows are not fully consumed
+        lines = r.iter_lines(decode_unicode=True)
 
-    for l in lines:
-        l_float = map(float, l.split())
-        # Scale with the density the magnitudes that depend on it
-        output.append(list(map(lambda a, b: a * b, l_float, unit_scale)))
+        # TODO: Catch unexisting material
+        number_pattern = r'-?[0-9]+\.?[0-9]*E[-+][0-9]+'
 
-    if not output:
-        warnings.warn("Empty list returned. Is the NIST page working?:\n%s" % url)
-    return output
+        if density is None or density is False:  # If false, do not scale
+            density = 1.0
+        elif density is True:  # If density is True, read from html
+            if particle == "e":
+                # The first scientific number is the density, which is found before the table
+                for line in lines:
+                    match = re.search(number_pattern, line)
+                    if match:
+                        density = float(match.group(0))
+                        break
+            else:
+                density = _fetch_ap_density(z)
+
+        # Only the energies of the default grid are shared, not those chosen by the user
+        intern = float if "Energies" in data else grids.intern_point
+
+        # Find lines with seven numbers ending in <br>
+        # In e, all in scientific notation, in a and p the last one is a proper ratio (in (0, 1)).
+        if particle == "e":
+            row_pattern = "(" + (number_pattern + "  ") * 6 + number_pattern + ")" + "<br>"
+            unit_scale = [1.0, density, density, density, 1 / density, 1.0, 1.0]
+        else:  # p or a
+            row_pattern = "(" + (number_pattern + "  ") * 6 + "0.[0-9]+" + ")" + "<br>"
+            unit_scale = [1.0, density, density, density, 1 / density, 1 / density, 1]
+
+        for line in lines:
+            for l in re.findall(row_pattern, line):
+                l_float = list(map(float, l.split()))
+                # Scale with the density the magnitudes that depend on it
+                row = list(map(lambda a, b: a * b, l_float[1:], unit_scale[1:]))
+                yield [intern(l_float[0])] + row
+    finally:
+        r.close()
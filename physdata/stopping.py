@@ -0,0 +1,117 @@
+# -*- coding: UTF-8 -*-
+
+"""stopping.py: A module to compute spectrum-averaged stopping-power ratios from the
+`ESTAR <https://www.nist.gov/pml/stopping-power-range-tables-electrons-protons-and-helium-ions>`_ tables.
+
+The ratio of a medium to a reference material (water by default) is computed in the Bragg-Gray approximation, as the
+ratio of the collision stopping powers averaged over the electron fluence spectrum. Since the same fluence crosses
+both media, only the shape of each spectrum matters, not its normalization. Radiative losses leave the cavity and are
+not included.
+
+Example:
+    Ratios of air, aluminium and graphite to water for a library of spectra::
+
+        import numpy as np
+        from physdata import stopping
+
+        energies = np.logspace(-2, 1, 200)
+        spectra = np.random.rand(5000, len(energies))  # Fluence in each energy bin
+        ratios = stopping.StoppingPowerRatios(energies, [104, 13, 906]).ratios(spectra)
+
+"""
+
+import numpy as np
+
+from physdata import lazy, star
+from physdata.interpolation import table_on_grid, trapezoid_weights
+
+#: ESTAR id of liquid water, the default reference material.
+WATER = 276
+
+
+def _as_estar_table(material):
+    # Accept an already fetched (or deferred) table or an ESTAR id to fetch
+    if isinstance(material, lazy.LazyTable):
+        return material.get()
+    if isinstance(material, (list, np.ndarray)):
+        return material
+    return star.fetch_estar(material)
+
+
+class StoppingPowerRatios:
+    """
+    A calculator of spectrum-averaged collision stopping-power ratios for a set of materials on a fixed energy grid.
+
+    Attributes:
+        energies (numpy.ndarray): The kinetic energy grid of the spectra in MeV.
+        materials (List): The materials, as given on creation.
+        stopping_powers (numpy.ndarray): The mass collision stopping powers in MeV cm^2/g interpolated on the grid, with
+                                         shape (number of materials, number of energies).
+        reference (numpy.ndarray): The mass collision stopping power of the reference material on the grid.
+
+    """
+
+    def __init__(self, energies, materials, reference=WATER, differential=False):
+        """
+        Create a StoppingPowerRatios calculator, interpolating the stopping power of each material on the energy grid.
+
+        Args:
+            energies (array_like): The increasing kinetic energies in MeV where spectra will be given.
+            materials (List): The materials, each either an ESTAR material id or a table in mass units as returned by
+                              :func:`physdata.star.fetch_estar`.
+            reference (int or List): The reference material, as the materials. By default, liquid water.
+            differential (bool): If True, the spectra will be given as a fluence per unit energy and integrated with
+                                 the trapezoidal rule. Otherwise, they are the fluence in each energy bin.
+
+        """
+        self.energies = np.asarray(energies, dtype=float)
+        if self.energies.ndim != 1:
+            raise ValueError("energies must be a 1D array")
+        self.materials = list(materials)
+        self.stopping_powers = np.array([table_on_grid(_as_estar_table(m), self.energies, 1) for m in self.materials])
+        self.reference = table_on_grid(_as_estar_table(reference), self.energies, 1)
+        self._weights = trapezoid_weights(self.energies) if differential else np.ones_like(self.energies)
+
+    def __repr__(self):
+        return ("StoppingPowerRatios<" + str(len(self.materials)) + " materials, " + str(len(self.energies)) +
+                " energies>")
+
+    def ratios(self, spectra):
+        """
+        Compute the stopping-power ratios of each material to the reference one for each spectrum.
+
+        Args:
+            spectra (array_like): The electron fluence spectra, with shape (number of spectra, number of energies), or a
+                                  single spectrum.
+
+        Returns:
+            numpy.ndarray: The ratios, with shape (number of spectra, number of materials), or (number of materials,) if
+            a single spectrum was given.
+
+        """
+        spectra = np.asarray(spectra, dtype=float)
+        if spectra.shape[-1] != len(self.energies):
+            raise ValueError("the last dimension of spectra must match the energy grid")
+        weighted = spectra * self._weights
+        return weighted.dot(self.stopping_powers.T) / weighted.dot(self.reference)[..., np.newaxis]
+
+
+def stopping_power_ratios(energies, spectra, materials, reference=WATER, differential=False):
+    """
+    Compute the spectrum-averaged stopping-power ratios of some materials to a reference one.
+
+    The tables are fetched and interpolated in every call. When more spectra on the same grid will come later, keep a
+    :obj:`StoppingPowerRatios` instead.
+
+    Args:
+        energies (array_like): The increasing kinetic energies in MeV.
+        spectra (array_like): The electron fluence spectra, with shape (number of spectra, number of energies).
+        materials (List): The materials, as in :obj:`StoppingPowerRatios`.
+        reference (int or List): The reference material. By default, liquid water.
+        differential (bool): Whether the spectra are given per unit energy, as in :obj:`StoppingPowerRatios`.
+
+    Returns:
+        numpy.ndarray: The ratios, with shape (number of spectra, number of materials).
+
+    """
+    return StoppingPowerRatios(energies, materials, reference, differential).ratios(spectra)
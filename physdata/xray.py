@@ -6,18 +6,23 @@
 """
 from __future__ import print_function
 
-import requests
 import re
 import sys
-from copy import deepcopy
+from bisect import bisect_left, bisect_right
 import warnings
 
+from physdata import grids, lazy, scheduler
+
+
+def _border_positions(data):
+    # Positions where a border starts (the energy is repeated in the next row)
+    return [index for index, values in enumerate(zip(data[:-1], data[1:])) if values[0][0] == values[1][0]]
+
 
 def _split_borders(data, border_separation=1E-8):
-    # Positions where a border starts
-    new_data = deepcopy(data)
-    repeated = [index for index, values in enumerate(zip(data[:-1], data[1:])) if values[0][0] == values[1][0]]
-    # TODO: Check excess epsilon
+    # Energies are the only values modified, so copying each row suffices
+    new_data = [list(row) for row in data]
+    repeated = _border_positions(data)
 
     borders_distance = [new_data[i][0] - new_data[i - 1][0] for i in repeated] + [
         new_data[i + 2][0] - new_data[i + 1][0] for i in repeated]
@@ -35,6 +40,191 @@ def _split_borders(data, border_separation=1E-8):
     return new_data
 
 
+def _iter_split_borders(rows, border_separation=1E-8):
+    # Streaming version of _split_borders, using a single row of lookahead. As the full table is not known in
+    # advance, each side of a border is reduced on its own if the separation would overlap the neighbouring row.
+    rows = iter(rows)
+    warned = False
+    previous = None  # Energy of the last yielded row, before any shift
+    upper_side = False  # Whether the current row is the upper side of a border
+    current = next(rows, None)
+    while current is not None:
+        following = next(rows, None)
+        energy = current[0]
+        separation = border_separation
+        if upper_side:
+            if following is not None and following[0] - energy < separation:
+                separation = (following[0] - energy) / 2
+            current[0] = energy + separation
+            upper_side = False
+        elif following is not None and following[0] == energy:
+            if previous is not None and energy - previous < separation:
+                separation = (energy - previous) / 2
+            current[0] = energy - separation
+            upper_side = True
+        if separation != border_separation and not warned:
+            print("The value of the border-separation parameter is too big. It has automatically been reduced.",
+                  file=sys.stderr)
+            warned = True
+        previous = energy
+        yield current
+        current = following
+
+
+class AbsorptionEdges:
+    """
+    The absorption edges of a table of coefficients.
+
+    Edges are kept with their exact energy, storing the tabulated values at both sides of each of them. The energy
+    axis is thus divided in segments: the segment i contains the energies between the edges i-1 and i, so there is one
+    more segment than edges.
+
+    Attributes:
+        energies (List[float]): The sorted energies of the edges in MeV.
+        below (List[List[float]]): For each edge, the coefficients tabulated just below it (excluding the energy).
+        above (List[List[float]]): For each edge, the coefficients tabulated just above it (excluding the energy).
+
+    """
+
+    def __init__(self, energies, below, above):
+        """
+        Create an AbsorptionEdges instance.
+
+        Args:
+            energies (List[float]): The sorted energies of the edges in MeV.
+            below (List[List[float]]): For each edge, the coefficients just below it.
+            above (List[List[float]]): For each edge, the coefficients just above it.
+
+        """
+        self.energies = energies
+        self.below = below
+        self.above = above
+
+    def __repr__(self):
+        return "AbsorptionEdges<" + str(len(self.energies)) + ">"
+
+    def __len__(self):
+        return len(self.energies)
+
+    def segment(self, energy):
+        """
+        Find the segment an energy belongs to.
+
+        Args:
+            energy (float): The energy in MeV. An energy exactly at an edge is assigned to the segment above it.
+
+        Returns:
+            int: The index of the segment, that is, the number of edges with an energy lower or equal to the given one.
+
+        """
+        return bisect_right(self.energies, energy)
+
+    def find(self, energy):
+        """
+        Find the edge at a certain energy.
+
+        Args:
+            energy (float): The energy in MeV.
+
+        Returns:
+            int: The index of the edge with exactly that energy or None if there is no such edge.
+
+        """
+        i = bisect_left(self.energies, energy)
+        if i < len(self.energies) and self.energies[i] == energy:
+            return i
+        return None
+
+    def between(self, low, high):
+        """
+        Find the edges inside an energy interval.
+
+        Args:
+            low (float): The lower limit of the interval in MeV.
+            high (float): The upper limit of the interval in MeV.
+
+        Returns:
+            range: The indexes of the edges whose energy is strictly between the limits.
+
+        """
+        return range(bisect_right(self.energies, low), bisect_left(self.energies, high))
+
+
+class CoefficientTable:
+    """
+    A table of coefficients with exact energies and its absorption edges available as first-class data.
+
+    Attributes:
+        rows (List[List[float]]): The rows as tabulated in the website, with the energy repeated at each edge. See
+                                  :func:`fetch_coefficients` for their content.
+        edges (:obj:`AbsorptionEdges`): The absorption edges in the table.
+
+    """
+
+    def __init__(self, rows):
+        """
+        Create a CoefficientTable instance from the rows of the NIST table.
+
+        Args:
+            rows (List[List[float]]): The rows of the table, with the energy repeated at each edge.
+
+        """
+        self.rows = rows
+        positions = _border_positions(rows)
+        self.edges = AbsorptionEdges([rows[i][0] for i in positions], [rows[i][1:] for i in positions],
+                                     [rows[i + 1][1:] for i in positions])
+        # Rows of each segment, as (start, stop) positions. Consecutive segments share the energy of their edge.
+        starts = [0] + [i + 1 for i in positions]
+        stops = [i + 1 for i in positions] + [len(rows)]
+        self._slices = list(zip(starts, stops))
+        self._grid = None
+
+    def __repr__(self):
+        return "CoefficientTable<" + str(len(self.rows)) + " rows, " + str(len(self.edges)) + " edges>"
+
+    def __len__(self):
+        return len(self.rows)
+
+    @property
+    def grid(self):
+        """:obj:`physdata.grids.EnergyGrid`: The energies of the rows, shared with any other table using them."""
+        if self._grid is None:
+            self._grid = grids.grid_of(self)
+        return self._grid
+
+    @property
+    def segments(self):
+        """List[List[List[float]]]: The rows of each segment. Energies are strictly increasing in each of them."""
+        return [self.rows[start:stop] for start, stop in self._slices]
+
+    def segment_rows(self, energy):
+        """
+        Get the rows of the segment an energy belongs to.
+
+        Args:
+            energy (float): The energy in MeV. An energy exactly at an edge is assigned to the segment above it.
+
+        Returns:
+            List[List[float]]: The rows of the segment.
+
+        """
+        start, stop = self._slices[self.edges.segment(energy)]
+        return self.rows[start:stop]
+
+    def to_list(self, border_separation=1E-8):
+        """
+        Get the table in the format :func:`fetch_coefficients` uses.
+
+        Args:
+            border_separation (float): An amount in MeV to split the absorption edges in the data.
+
+        Returns:
+            List: a list with the data for each tabulated energy value.
+
+        """
+        return _split_borders(self.rows, border_separation) if border_separation else [list(row) for row in self.rows]
+
+
 class ElementData:
     """
     An element in the database.
@@ -78,6 +268,9 @@ class ElementData:
         else:
             return fetch_coefficients(self.z)
 
+    def get_coefficient_table(self, use_density=False):
+        return fetch_coefficient_table(self.z, self.density if use_density else None)
+
 
 class CompoundData:
     """
@@ -120,6 +313,9 @@ class CompoundData:
         else:
             return fetch_coefficients(self.short_name)
 
+    def get_coefficient_table(self, use_density=False):
+        return fetch_coefficient_table(self.short_name, self.density if use_density else None)
+
 
 def fetch_coefficients(z, density=None, border_separation=1E-8):
     """
@@ -138,35 +334,96 @@ def fetch_coefficients(z, density=None, border_separation=1E-8):
             * (float): Attenuation coefficient in cm^2/g or in cm^-1 if a density was given.
             * (float): Energy absorption coefficient in cm^2/g or in cm^-1 if a density was given.
 
+        In lazy mode (see :mod:`physdata.lazy`), a :obj:`physdata.lazy.LazyTable` with that list is returned instead.
+
     """
-    if density is None:
-        density = 1
+    if lazy.is_enabled():
+        return lazy.defer(fetch_coefficients, z, density, border_separation)
+    data = list(_iter_raw_coefficients(z, density))
+    return _split_borders(data, border_separation) if border_separation else data
+
+
+def fetch_coefficient_table(z, density=None):
+    """
+    Fetch from the website the data for an element or compound, keeping the absorption edges with their exact energy.
+
+    Args:
+        z (int or str): The atomic number (element) or a string representing the compound.
+        density (float, optional): If given, the density scaling is removed.
+
+    Returns:
+        :obj:`CoefficientTable`: The table, whose edges can be queried without shifting any energy.
+
+    """
+    return CoefficientTable(list(_iter_raw_coefficients(z, density)))
+
+
+def iter_coefficients(z, density=None, border_separation=1E-8):
+    """
+    Iterate over the data for an element or compound while it is downloaded from the website.
+
+    The rows are the same ones :func:`fetch_coefficients` returns, but they are yielded as soon as they are parsed.
+
+    Args:
+        z (int or str): The atomic number (element) or a string representing the compound.
+        density (float, optional): If given, the density scaling is removed.
+        border_separation (float): An amount in MeV to split the absorption edges in the data. Since the whole table is
+                                   not available in advance, if the value would overlap the next or previous energy
+                                   interval, it is reduced with a warning only for that side of the edge.
+
+    Returns:
+        Iterator[List]: An iterator over the rows of the table, each a list with:
+
+            * (float): Energy in MeV.
+            * (float): Attenuation coefficient in cm^2/g or in cm^-1 if a density was given.
+            * (float): Energy absorption coefficient in cm^2/g or in cm^-1 if a density was given.
+
+    """
+    rows = _iter_raw_coefficients(z, density)
+    return _iter_split_borders(rows, border_separation) if border_separation else rows
 
+
+def _coefficients_url(z):
     if type(z) is int or (type(z) is str and z.isdigit()):  # Either an integer or a string with a natural number
         str_z = str(z) if int(z) > 9 else "0" + str(z)  # Two digit string
-        url = "http://physics.nist.gov/PhysRefData/XrayMassCoef/ElemTab/z" + str_z + ".html"
+        return "http://physics.nist.gov/PhysRefData/XrayMassCoef/ElemTab/z" + str_z + ".html"
     else:
-        url = "http://physics.nist.gov/PhysRefData/XrayMassCoef/ComTab/" + z + ".html"
+        return "http://physics.nist.gov/PhysRefData/XrayMassCoef/ComTab/" + z + ".html"
 
-    r = requests.get(url)
-    html = r.text
-    errored = False
-    try:
-        html = str(html).split("</DIV>")[2]  # Pick the div with the ascii table
 
-    except IndexError:
-        errored = True
-    if errored:
-        raise RuntimeError("Could not recognize page structure. Check if page is working:\n%s" % url)
+def _iter_raw_coefficients(z, density=None):
+    if density is None:
+        density = 1
+
+    url = _coefficients_url(z)
+    r = scheduler.get(url, stream=True)
+    if r.encoding is None:
+        r.encoding = "ISO-8859-1"
     # How numbers are represented in the NIST web.
     number_pattern = r'-?[0-9]+\.?[0-9]*E[-+][0-9]+'
-    lines = re.findall(number_pattern + "  " + number_pattern + "  " + number_pattern, html)
-    data = []
-    for l in lines:
-        l2 = list(map(float, l.split("  ")))
-
-        data.append([l2[0], l2[1] * density, l2[2] * density])
-    return _split_borders(data, border_separation) if border_separation else data
+    try:  # Release the connection even if the rows are not fully consumed
+        for text in _iter_section(r.iter_lines(decode_unicode=True), url):
+            for l in re.findall(number_pattern + "  " + number_pattern + "  " + number_pattern, text):
+                l2 = list(map(float, l.split("  ")))
+                yield [grids.intern_point(l2[0]), l2[1] * density, l2[2] * density]
+    finally:
+        r.close()
+
+
+def _iter_section(lines, url, separator="</DIV>", index=2):
+    # Yield the text between the index-th and the (index+1)-th separator, reading the html line by line.
+    # With the default values, this picks the div with the ascii table.
+    count = 0
+    for line in lines:
+        for i, text in enumerate(line.split(separator)):
+            if i:
+                count += 1
+            if count == index:
+                yield text
+            elif count > index:
+                return
+    if count < index:
+        raise RuntimeError("Could not recognize page structure. Check if page is working:\n%s" % url)
 
 
 def fetch_elements():
@@ -178,7 +435,7 @@ def fetch_elements():
 
     """
     url = "http://physics.nist.gov/PhysRefData/XrayMassCoef/tab1.html"
-    r = requests.get(url)
+    r = scheduler.get(url)
     html = r.text
     rows = re.findall(r"<TR.*?>(.*?)</TR>", html, re.DOTALL)[3:]  # Pick the rows, excluding the headers
     output = []
@@ -204,7 +461,7 @@ def fetch_compounds():
 
     """
     # First relate short names with names from the links in table 4
-    r = requests.get("http://physics.nist.gov/PhysRefData/XrayMassCoef/tab4.html")
+    r = scheduler.get("http://physics.nist.gov/PhysRefData/XrayMassCoef/tab4.html")
     html = r.text
     cells = re.findall(r"<TD.*?>(.*?)</TD>", html, re.DOTALL)[4:]  # Pick the cells, excluding the headers
     cells = list(filter(lambda s: s != "&nbsp;", map(lambda x: x.strip(), cells)))
@@ -220,7 +477,7 @@ def fetch_compounds():
         name_dict[data[1] + data[2]] = data[0]
 
     # Now fetch the compound data
-    r = requests.get("http://physics.nist.gov/PhysRefData/XrayMassCoef/tab2.html")
+    r = scheduler.get("http://physics.nist.gov/PhysRefData/XrayMassCoef/tab2.html")
     html = r.text
     rows = re.findall(r"<TR.*?>(.*?)</TR>", html, re.DOTALL)[3:]  # Pick the rows, excluding the headers
     output = []
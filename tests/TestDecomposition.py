@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+TestDecomposition.py: Tests for the `decomposition` module.
+"""
+
+import unittest
+
+import numpy as np
+
+from physdata import decomposition, xray
+
+
+class TestDecomposition(unittest.TestCase):
+    def setUp(self):
+        elements = xray.fetch_elements()
+        compounds = {c.short_name: c for c in xray.fetch_compounds()}
+        self.basis = [compounds["water"], elements[19]]  # Water and calcium
+        spectrum_low = (np.linspace(0.02, 0.08, 13), np.linspace(1, 0.2, 13))
+        spectrum_high = (np.linspace(0.03, 0.14, 23), np.linspace(1, 0.3, 23))
+        self.decomposer = decomposition.DualEnergyDecomposition(self.basis, spectrum_low, spectrum_high,
+                                                                effective_z=[7.42, 20])
+
+    def test_decompose(self):
+        densities = np.random.rand(2, 30, 40)
+        low, high = np.tensordot(self.decomposer.attenuation, densities, axes=1)
+        self.assertTrue(np.allclose(self.decomposer.decompose(low, high), densities))
+        # Chunked processing into a given array
+        out = np.empty((2, 30, 40))
+        self.decomposer.decompose(low, high, chunk_size=7, out=out)
+        self.assertTrue(np.allclose(out, densities))
+
+    def test_maps(self):
+        # Pure water and pure calcium pixels
+        densities = np.array([[1.0, 0.0], [0.0, 1.55]])
+        low, high = self.decomposer.attenuation.dot(densities)
+        maps = self.decomposer.maps(low, high, chunk_size=1)
+        self.assertTrue(np.allclose(maps["densities"], densities))
+        self.assertTrue(np.allclose(maps["effective_z"], [7.42, 20]))
+        self.assertTrue(np.allclose(maps["electron_density"],
+                                    [decomposition.AVOGADRO * self.basis[0].mass_ratio,
+                                     decomposition.AVOGADRO * self.basis[1].mass_ratio * 1.55]))
+
+
+if __name__ == "__main__":
+    unittest.main()
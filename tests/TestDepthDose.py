@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+TestDepthDose.py: Tests for the `depthdose` module.
+"""
+
+import unittest
+
+import numpy as np
+
+from physdata import depthdose, star
+from synthetic import pstar_table
+
+
+class TestDepthDose(unittest.TestCase):
+    def test_synthetic(self):
+        table = pstar_table()
+        energies = np.array([100.0, 150.0, 200.0])
+        edges = np.linspace(0, 42, 4201)
+        curves = depthdose.depth_dose(energies, [(table, 2.0, 2.0), (table, 1.0, 40.0)], edges=edges)
+        self.assertEqual(curves.dose.shape, (3, 4200))
+        # All the energy is deposited
+        masses = np.diff(edges) * np.where(curves.depths < 2.0, 2.0, 1.0)
+        self.assertTrue(np.allclose((curves.dose * masses).sum(axis=1), energies))
+        # Ranges (scaling the first layer by its density) and peaks
+        expected = 0.0022 * energies ** 1.75 * 0.998 - 2.0
+        self.assertTrue(np.allclose(curves.ranges, expected, rtol=1E-3))
+        self.assertTrue(np.all(np.abs(curves.peak_depths - expected) < 0.05))
+        # An energy spread widens and lowers the peak
+        spread = depthdose.depth_dose(energies, [(table, 2.0, 2.0), (table, 1.0, 40.0)], edges=edges, spread=2.0)
+        self.assertTrue(np.all(spread.dose.max(axis=1) < curves.dose.max(axis=1)))
+        self.assertTrue(np.allclose(spread.ranges, expected, rtol=1E-2))
+
+    def test_peak_depths(self):
+        # A parabolic curve sampled on bins of different widths
+        edges = np.concatenate([np.linspace(0, 3, 7), np.linspace(3.1, 4, 10), np.linspace(4.5, 10, 12)])
+        depths = (edges[1:] + edges[:-1]) / 2
+        curves = depthdose.DepthDose(edges, np.array([50 - (depths - 3.7) ** 2]), None, None)
+        self.assertAlmostEqual(curves.peak_depths[0], 3.7)
+        # A single bin
+        table = pstar_table()
+        curves = depthdose.depth_dose([100.0], [(table, 1.0, 10.0)], bins=1)
+        self.assertEqual(curves.peak_depths[0], 5.0)
+
+    def test_pstar(self):
+        water = star.fetch_pstar(276)
+        curves = depthdose.depth_dose([100.0], [(water, 1.0, 10.0)], bins=1000)
+        # Projected range of 100 MeV protons in water is about 7.7 cm
+        self.assertAlmostEqual(curves.ranges[0], 7.7, places=1)
+        self.assertAlmostEqual(curves.peak_depths[0], 7.7, places=1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+TestDosimetry.py: Tests for the `dosimetry` module.
+"""
+
+import unittest
+
+import numpy as np
+
+from physdata import dosimetry, xray
+from synthetic import assert_rows_match, xray_table
+
+
+class TestDosimetry(unittest.TestCase):
+    def test_synthetic(self):
+        # With mu_en/rho proportional to E^-2.5, the ratio between materials does not depend on the spectrum
+        energies = np.linspace(0.02, 0.1, 30)
+        spectra = np.random.rand(10, len(energies))
+        calculator = dosimetry.DoseCalculator(energies, [xray_table(1E-4), xray_table(3E-4)], differential=True)
+        self.assertTrue(np.allclose(calculator.conversion_factors(spectra)[:, 1], 3.0))
+        assert_rows_match(self, calculator.dose, spectra, calculator.dose(spectra))
+
+    def test_monoenergetic(self):
+        # Tabulated energies are reproduced exactly
+        water = xray.fetch_coefficients("water")
+        energy, mu_en = water[20][0], water[20][2]
+        kerma = dosimetry.collision_kerma([energy], [[1E10]], ["water"])
+        self.assertEqual(kerma.shape, (1, 1))
+        self.assertAlmostEqual(kerma[0, 0] / (1E10 * energy * mu_en * dosimetry.MEV_PER_G_TO_GY), 1.0)
+
+    def test_batch(self):
+        energies = np.linspace(0.01, 0.15, 50)
+        spectra = np.random.rand(20, len(energies))
+        calculator = dosimetry.DoseCalculator(energies, ["air", "water", xray.fetch_coefficient_table(13)])
+        kerma = calculator.collision_kerma(spectra)
+        self.assertEqual(kerma.shape, (20, 3))
+        assert_rows_match(self, calculator.collision_kerma, spectra, kerma)
+        factors = calculator.conversion_factors(spectra, reference="air")
+        self.assertTrue(np.allclose(factors[:, 0], 1.0))
+        self.assertTrue(np.allclose(factors[:, 1], kerma[:, 1] / kerma[:, 0]))
+        # Water to air ratio is close to 1.1 in this energy range
+        self.assertTrue(np.all((factors[:, 1] > 1.0) & (factors[:, 1] < 1.2)))
+
+    def test_reference(self):
+        energies = np.linspace(0.01, 0.15, 50)
+        calculator = dosimetry.DoseCalculator(energies, ["water", 13])
+        spectra = np.random.rand(5, len(energies))
+        # An atomic number in the list is the material, not an index
+        self.assertTrue(np.allclose(calculator.conversion_factors(spectra, reference=13)[:, 1], 1.0))
+        self.assertTrue(np.allclose(calculator.conversion_factors(spectra, reference=1)[:, 1], 1.0))
+        self.assertTrue(np.allclose(calculator.conversion_factors(spectra, reference="water")[:, 0], 1.0))
+        with self.assertRaises(ValueError):
+            calculator.conversion_factors(spectra, reference=2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+TestGrids.py: Tests for the `grids` module.
+"""
+
+import unittest
+
+from physdata import grids, scheduler, star
+from synthetic import PageScheduler
+
+
+class TestGrids(unittest.TestCase):
+    def test_registry(self):
+        registry = grids.GridRegistry()
+        a, b = float("1.5"), float("1.5")
+        self.assertIs(registry.intern_point(a), registry.intern_point(b))
+        grid = registry.intern([1.0, 2.0])
+        self.assertIs(registry.intern((1.0, 2.0)), grid)
+        self.assertEqual(list(grid.array), [1.0, 2.0])
+        self.assertFalse(grid.array.flags.writeable)
+
+    def test_bounded(self):
+        registry = grids.GridRegistry(max_points=2, max_grids=1)
+        for value in (1.0, 2.0, 3.0, 4.0):
+            registry.intern_point(value)
+        self.assertEqual(len(registry._points), 2)
+        # Values beyond the limit are returned, but not stored
+        a, b = float("3.5"), float("3.5")
+        self.assertEqual(registry.intern_point(a), 3.5)
+        self.assertIsNot(registry.intern_point(a), registry.intern_point(b))
+        registry.intern([1.0])
+        self.assertIsNot(registry.intern([2.0]), registry.intern([2.0]))
+        self.assertEqual(len(registry), 1)
+
+    def test_custom_energies(self):
+        # Energies chosen by the user are not interned
+        previous = scheduler.get_scheduler()
+        page = "<pre>\n1.234E+00  2.000E+00  3.000E+00  4.000E+00  5.000E+00  6.000E+00  7.000E+00<br>\n</pre>"
+        scheduler.set_scheduler(PageScheduler(page))
+        try:
+            self.assertEqual(star.fetch_estar(13, energies=[1.234])[0][0], 1.234)
+            self.assertNotIn(1.234, grids.get_registry()._points)
+            # Unlike those of the default grid
+            star.fetch_estar(13)
+            self.assertIn(1.234, grids.get_registry()._points)
+        finally:
+            scheduler.set_scheduler(previous)
+
+
+if __name__ == "__main__":
+    unittest.main()
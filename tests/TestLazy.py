@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+TestLazy.py: Tests for the `lazy` module.
+"""
+
+import threading
+import time
+import unittest
+
+import numpy as np
+
+from physdata import dosimetry, lazy, star, stopping, xray
+from synthetic import estar_table, xray_table
+
+_calls = []
+_calls_lock = threading.Lock()
+
+
+def _slow_table(n):
+    # A fetch function taking 0.2 s
+    with _calls_lock:
+        _calls.append(n)
+    time.sleep(0.2)
+    if n < 0:
+        raise ValueError("negative")
+    return [[float(n), 1.0, 2.0]]
+
+
+class TestLazy(unittest.TestCase):
+    def setUp(self):
+        del _calls[:]
+
+    def test_batch(self):
+        tables = [lazy.defer(_slow_table, n % 4) for n in range(8)]
+        # Repeated calls share the handle
+        self.assertIs(tables[0], tables[4])
+        self.assertEqual(lazy.pending(), 4)
+        self.assertFalse(tables[0].resolved)
+        t = time.time()
+        # Accessing any handle resolves all of them concurrently
+        self.assertEqual(tables[1][0][0], 1.0)
+        self.assertTrue(time.time() - t < 0.6)
+        self.assertTrue(all(table.resolved for table in tables))
+        self.assertEqual(sorted(_calls), [0, 1, 2, 3])
+        self.assertEqual(lazy.pending(), 0)
+        self.assertEqual(list(tables[2]), [[2.0, 1.0, 2.0]])
+        self.assertTrue(np.array_equal(np.asarray(tables[3]), [[3.0, 1.0, 2.0]]))
+
+    def test_errors(self):
+        good, bad = lazy.defer(_slow_table, 1), lazy.defer(_slow_table, -1)
+        self.assertEqual(lazy.resolve_all(), 2)
+        self.assertEqual(len(good), 1)
+        with self.assertRaises(ValueError):
+            bad.get()
+
+    def test_mode(self):
+        self.assertFalse(lazy.is_enabled())
+        with lazy.batch():
+            self.assertTrue(lazy.is_enabled())
+            table = xray.fetch_coefficients(26)
+            self.assertIsInstance(table, lazy.LazyTable)
+            self.assertIsInstance(star.fetch_pstar(276, energies=[1, 10]), lazy.LazyTable)
+            self.assertEqual(lazy.pending(), 2)
+        self.assertFalse(lazy.is_enabled())
+        self.assertEqual(lazy.pending(), 0)
+        self.assertTrue(table.resolved)
+
+    def test_consumers(self):
+        # Handles can be given wherever a fetched table is accepted
+        energies = np.linspace(0.02, 0.1, 10)
+        water, bone = lazy.defer(xray_table, 1E-4), lazy.defer(xray_table, 3E-4)
+        calculator = dosimetry.DoseCalculator(energies, [water, bone])
+        self.assertTrue(np.allclose(calculator.mu_en,
+                                    dosimetry.DoseCalculator(energies, [xray_table(1E-4), xray_table(3E-4)]).mu_en))
+        air = lazy.defer(estar_table, 2.0)
+        ratios = stopping.StoppingPowerRatios(energies, [air], reference=lazy.defer(estar_table, 1.0))
+        self.assertTrue(np.allclose(ratios.ratios(np.ones(len(energies))), 2.0))
+
+    def test_fetch(self):
+        elements = xray.fetch_elements()[:10]
+        with lazy.batch():
+            tables = [e.get_coefficients() for e in elements]
+        self.assertEqual(tables[5], xray.fetch_coefficients(6))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+TestPrefetch.py: Tests for the `prefetch` module.
+"""
+
+import threading
+import unittest
+import warnings
+
+from physdata import prefetch, scheduler, xray
+from physdata.cache import Cache, CachedResponse
+
+
+class _SmallPrefetch(prefetch.Prefetch):
+    # A prefetch of the first materials of each list only
+    def _tasks(self, elements, compounds, particles):
+        tasks = prefetch.Prefetch._tasks(self, elements, compounds, particles)
+        return [task for task in tasks if task[0] in ("xray 1", "xray 2", "star p 1", "star p 2")]
+
+
+class TestPrefetch(unittest.TestCase):
+    def setUp(self):
+        self.previous = scheduler.get_scheduler()
+        scheduler.set_scheduler(scheduler.Scheduler(cache=Cache()))
+
+    def tearDown(self):
+        scheduler.set_scheduler(self.previous)
+
+    def test_prefetch(self):
+        progress = []
+        job = _SmallPrefetch(True, False, ("p",), 2, lambda *args: progress.append(args))
+        self.assertTrue(job.wait(600))
+        self.assertTrue(job.done)
+        self.assertEqual(job.failed, [])
+        self.assertEqual(job.total, 4)
+        self.assertEqual(job.completed, job.total)
+        self.assertEqual(len(progress), job.total)
+        # Now served from the cache
+        cached = len(scheduler.get_scheduler().cache)
+        xray.fetch_coefficients(2)
+        self.assertEqual(len(scheduler.get_scheduler().cache), cached)
+
+    def test_cancel(self):
+        # A website with empty lists of materials, answering once the prefetch is cancelled
+        urls = []
+        cancelled = threading.Event()
+
+        def request(method, url, **kwargs):
+            urls.append(url)
+            cancelled.wait(5)
+            return CachedResponse("", url)
+
+        scheduler.get_scheduler().request = request
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            job = prefetch.prefetch(workers=1)
+            job.cancel()
+            cancelled.set()
+            self.assertTrue(job.wait(10))
+        self.assertTrue(job.cancelled)
+        self.assertTrue(job.total is None)
+        # At most the list being fetched when cancelled was requested
+        self.assertTrue(len(urls) <= 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,187 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+TestScheduler.py: Tests for the `scheduler` module.
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+import warnings
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+import requests
+
+from physdata import cache, scheduler
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        pass  # Clients closing timed out or hedged requests
+
+
+class _ThrottlingHandler(BaseHTTPRequestHandler):
+    # Paths /n throttle the first n requests, paths /slow/n delay the first n requests for a second
+    hits = {}
+
+    def do_GET(self):
+        count = self.hits.get(self.path, 0)
+        self.hits[self.path] = count + 1
+        if self.path.startswith("/slow/"):
+            if count < int(self.path[6:]):
+                time.sleep(1)
+            self.send_response(200)
+            self.end_headers()
+            self.wfile.write(b"slow")
+        elif count < int(self.path.strip("/")):
+            self.send_response(429)
+            self.send_header("Retry-After", "0")
+            self.end_headers()
+        else:
+            self.send_response(200)
+            self.end_headers()
+            self.wfile.write(b"ok")
+
+    def log_message(self, *args):
+        pass
+
+
+class TestScheduler(unittest.TestCase):
+    def test_token_bucket(self):
+        bucket = scheduler.TokenBucket(rate=20, burst=2)
+        t = time.time()
+        for _ in range(6):
+            bucket.acquire()
+        # Two tokens are available at once, the other four take 1/20 s each
+        self.assertTrue(time.time() - t >= 0.19)
+
+    def test_shared_bucket(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, "physdata.lock")
+            # Two buckets on the same file share the budget
+            buckets = [scheduler.TokenBucket(rate=20, burst=1, lock_file=path) for _ in range(2)]
+            t = time.time()
+            for _ in range(3):
+                for bucket in buckets:
+                    bucket.acquire()
+            self.assertTrue(time.time() - t >= 0.24)
+        finally:
+            shutil.rmtree(directory)
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _ThrottlingHandler)
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.url = "http://127.0.0.1:%d/" % self.server.server_address[1]
+        _ThrottlingHandler.hits.clear()
+
+    def tearDown(self):
+        self._stop_server()
+
+    def _stop_server(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def test_retries(self):
+        s = scheduler.Scheduler(rate=None, retries=2, backoff=0.01)
+        self.assertEqual(s.get(self.url + "2").text, "ok")
+        with self.assertRaises(scheduler.RateLimitError):
+            s.get(self.url + "3")
+
+    def test_timeouts(self):
+        s = scheduler.Scheduler(rate=None, retries=0, timeout=0.2)
+        t = time.time()
+        with self.assertRaises(requests.exceptions.Timeout):
+            s.get(self.url + "slow/1")
+        self.assertTrue(time.time() - t < 0.9)
+        # The deadline reduces the timeout of the requests
+        s = scheduler.Scheduler(rate=None, retries=5, backoff=0.01, timeout=None)
+        with scheduler.deadline(0.3):
+            with self.assertRaises((requests.exceptions.Timeout, scheduler.DeadlineExceeded)):
+                s.get(self.url + "slow/10")
+            time.sleep(0.3)
+            with self.assertRaises(scheduler.DeadlineExceeded):
+                s.get(self.url + "0")
+
+    def test_connection_errors(self):
+        url = self.url
+        self._stop_server()
+        # Connection failures are not retried by default
+        s = scheduler.Scheduler(rate=None, backoff=10)
+        t = time.time()
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            s.get(url + "0")
+        self.assertTrue(time.time() - t < 1)
+        # Unless asked to
+        s = scheduler.Scheduler(rate=None, backoff=0.01, connection_retries=2)
+        attempts = []
+        send = s._send
+        s._send = lambda *args: attempts.append(args) or send(*args)
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            s.get(url + "0")
+        self.assertEqual(len(attempts), 3)
+
+    def test_hedging(self):
+        s = scheduler.Scheduler(rate=None, hedge_percentile=90, hedge_min_samples=5)
+        for _ in range(5):
+            s.get(self.url + "0")
+        # The first request is slow, but its duplicate answers quickly
+        t = time.time()
+        self.assertEqual(s.get(self.url + "slow/1").text, "slow")
+        self.assertTrue(time.time() - t < 0.9)
+
+    def test_hedging_rate(self):
+        s = scheduler.Scheduler(rate=5, burst=1, hedge_percentile=90, hedge_min_samples=5)
+        for _ in range(5):
+            s.get(self.url + "0")
+        _ThrottlingHandler.hits.clear()
+        threads = [threading.Thread(target=s.get, args=(self.url + "0",)) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # Requests waiting for the budget are not hedged, so no duplicate was made
+        self.assertEqual(_ThrottlingHandler.hits["/0"], 8)
+
+    def test_cache(self):
+        pages = cache.Cache(ttl=0)
+        s = scheduler.Scheduler(rate=None, retries=0, cache=pages)
+        self.assertEqual(s.get(self.url + "0").text, "ok")
+        self.assertEqual(len(pages), 1)
+        # The page expired, but it is used when the website cannot be reached
+        self._stop_server()
+        with warnings.catch_warnings(record=True) as w:
+            warnings.simplefilter("always")
+            r = s.get(self.url + "0")
+        self.assertTrue(isinstance(r, cache.CachedResponse))
+        self.assertEqual(r.text, "ok")
+        self.assertEqual(len(w), 1)
+        # Fresh pages are served without any request
+        pages.ttl = None
+        self.assertEqual(s.get(self.url + "0").text, "ok")
+
+    def test_in_flight(self):
+        s = scheduler.Scheduler(rate=None, cache=cache.Cache())
+        threads = [threading.Thread(target=s.get, args=(self.url + "slow/1",)) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+            time.sleep(0.05)
+        for thread in threads:
+            thread.join()
+        # Only the first thread made the request, the others waited for it
+        self.assertEqual(_ThrottlingHandler.hits["/slow/1"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+TestServer.py: Tests for the `server` module.
+"""
+
+import threading
+import unittest
+import warnings
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import numpy as np
+
+from physdata import cache, scheduler, server, star, xray
+
+
+class _UpstreamHandler(BaseHTTPRequestHandler):
+    # A website answering with the path of each request
+    hits = []
+
+    def do_GET(self):
+        self.hits.append(self.path)
+        if self.path == "/throttled":
+            self.send_response(429)
+            self.send_header("Retry-After", "0")
+            self.end_headers()
+            return
+        body = ("page " + self.path).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestServer(unittest.TestCase):
+    def setUp(self):
+        self.previous = scheduler.get_scheduler()
+        scheduler.configure(rate=None, cache=cache.Cache())
+        self.upstream = HTTPServer(("127.0.0.1", 0), _UpstreamHandler)
+        self.upstream_url = "http://127.0.0.1:%d" % self.upstream.server_address[1]
+        self.server = server.DataServer(port=0, allowed_hosts=(self.upstream_url[7:],))
+        for s in (self.upstream, self.server):
+            thread = threading.Thread(target=s.serve_forever)
+            thread.daemon = True
+            thread.start()
+        # The clients use the server as their transport
+        self.client = scheduler.Scheduler(rate=None, server=self.server.url)
+
+    def tearDown(self):
+        self._stop_upstream()
+        self.server.shutdown()
+        self.server.server_close()
+        scheduler.set_scheduler(self.previous)
+
+    def _stop_upstream(self):
+        if self.upstream is not None:
+            self.upstream.shutdown()
+            self.upstream.server_close()
+            self.upstream = None
+
+    def test_fetch(self):
+        del _UpstreamHandler.hits[:]
+        r = self.client.get(self.upstream_url + "/a")
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.text, "page /a")
+        # Other clients are served from the cache of the server
+        other = scheduler.Scheduler(rate=None, server=self.server.url)
+        self.assertEqual(other.get(self.upstream_url + "/a").text, "page /a")
+        self.assertEqual(_UpstreamHandler.hits, ["/a"])
+        # Only the allowed hosts are forwarded
+        with self.assertRaises(scheduler.ServerError):
+            self.client.get("http://example.com/")
+
+    def test_failures(self):
+        del _UpstreamHandler.hits[:]
+        # Throttling is retried by the server only, then reported to the client
+        scheduler.configure(rate=None, backoff=0.01)
+        client = scheduler.Scheduler(rate=None, backoff=0.01, server=self.server.url)
+        with self.assertRaises(scheduler.RateLimitError):
+            client.get(self.upstream_url + "/throttled")
+        self.assertEqual(_UpstreamHandler.hits, ["/throttled"] * (scheduler.get_scheduler().retries + 1))
+        # If the server cannot reach the website, the client uses its expired cache
+        client = scheduler.Scheduler(rate=None, server=self.server.url, cache=cache.Cache(ttl=0))
+        self.assertEqual(client.get(self.upstream_url + "/b").text, "page /b")
+        url = self.upstream_url
+        self._stop_upstream()
+        with warnings.catch_warnings(record=True) as w:
+            warnings.simplefilter("always")
+            self.assertEqual(client.get(url + "/b").text, "page /b")
+        self.assertEqual(len(w), 1)
+
+    def test_batch(self):
+        scheduler.set_scheduler(self.previous)  # The website is needed
+        client = server.Client(self.server.url)
+        tables = client.coefficients([1, 26, "water", 26])
+        self.assertEqual(sorted(map(str, tables)), ["1", "26", "water"])
+        self.assertTrue(np.allclose(tables[26], xray.fetch_coefficients(26)))
+        tables = client.star([276], particle="p", energies=[1, 10, 100])
+        self.assertTrue(np.allclose(tables[276], star.fetch_pstar(276, energies=[1, 10, 100])))
+        self.assertEqual(len(client.elements()), len(xray.fetch_elements()))
+        self.assertEqual(client.compounds()[0].short_name, xray.fetch_compounds()[0].short_name)
+
+
+if __name__ == "__main__":
+    unittest.main()
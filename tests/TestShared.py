@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+TestShared.py: Tests for the `shared` module.
+"""
+
+import unittest
+from multiprocessing import Pool
+
+from physdata import shared
+
+
+def _column_sum(args):
+    descriptor, key = args
+    with shared.attach(descriptor) as tables:
+        return float(tables[key][:, 1].sum())
+
+
+class TestShared(unittest.TestCase):
+    def setUp(self):
+        self.tables = {13: [[1.0, 2.0, 3.0], [4.0, 5.0, 6.0]],
+                       "water": [[1.0, 2.0, 3.0, 4.0, 5.0, 6.0, 7.0]]}
+
+    def test_publish(self):
+        with shared.SharedTables(self.tables) as published:
+            self.assertEqual(set(published), {13, "water"})
+            self.assertEqual(published[13].tolist(), self.tables[13])
+            self.assertEqual(published["water"].shape, (1, 7))
+            # Views are read-only
+            with self.assertRaises(ValueError):
+                published[13][0, 0] = 0.0
+        self.assertTrue(published.closed)
+
+    def test_attach(self):
+        with shared.SharedTables(self.tables) as published:
+            with shared.attach(published.descriptor) as attached:
+                self.assertEqual(attached["water"].tolist(), self.tables["water"])
+            # Detaching does not release the block of the owner
+            self.assertEqual(published[13].tolist(), self.tables[13])
+            pool = Pool(2)
+            try:
+                sums = pool.map(_column_sum, [(published.descriptor, 13), (published.descriptor, "water")])
+            finally:
+                pool.close()
+                pool.join()
+            self.assertEqual(sums, [7.0, 2.0])
+
+
+if __name__ == "__main__":
+    unittest.main()
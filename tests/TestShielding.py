@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+TestShielding.py: Tests for the `shielding` module.
+"""
+
+import unittest
+
+import numpy as np
+
+from physdata import shielding, xray
+from synthetic import xray_table
+
+
+class TestShielding(unittest.TestCase):
+    def setUp(self):
+        self.energies = np.linspace(0.02, 0.15, 40)
+        self.solver = shielding.ShieldingSolver(self.energies, [xray_table(1E-4), xray_table(5E-3)],
+                                                densities=[2.3, 11.35])
+        self.spectra = np.array([np.exp(-self.energies / 0.04), np.ones_like(self.energies)])
+
+    def test_lines(self):
+        thicknesses = self.solver.thicknesses([0.5, 0.1], weights=None)
+        self.assertEqual(thicknesses.shape, (2, 40, 2))
+        self.assertTrue(np.allclose(np.log(2) / self.solver.attenuation, thicknesses[:, :, 0]))
+
+    def test_spectra(self):
+        targets = [1.0, 0.1, 1E-3, 1E-6]
+        thicknesses = self.solver.thicknesses(targets, self.spectra)
+        self.assertEqual(thicknesses.shape, (2, 2, 4))
+        self.assertTrue(np.all(np.diff(thicknesses, axis=-1) > 0))
+        # The transmission through the solution is the target
+        for m in range(2):
+            for s in range(2):
+                transmission = self.solver.transmission(thicknesses[m, s], self.spectra[s])[m]
+                self.assertTrue(np.allclose(transmission, targets, rtol=1E-8))
+        # A single spectrum drops the spectra axis
+        self.assertTrue(np.allclose(self.solver.thicknesses(targets, self.spectra[1]), thicknesses[:, 1]))
+        with self.assertRaises(ValueError):
+            self.solver.thicknesses([0.0])
+
+    def test_materials(self):
+        elements = xray.fetch_elements()
+        lead = elements[81]
+        thicknesses = shielding.shielding_thicknesses([0.1, 1.0], [lead], 0.5)
+        mu = np.array([lead.density * row[1] for row in xray.fetch_coefficients(82) if row[0] in (0.1, 1.0)])
+        self.assertTrue(np.allclose(thicknesses[0, :, 0], np.log(2) / mu))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -7,7 +7,15 @@ TestStar.py: Tests for the `star` module.
 
 import unittest
 
-from physdata import star
+from physdata import grids, scheduler, star
+from synthetic import PageScheduler
+
+_ESTAR_PAGE = """<html><body>
+Density (g/cm<sup>3</sup>): 2.699E+00<br>
+<pre>
+1.000E-02  1.649E+01  6.559E-03  1.650E+01  7.711E-04  3.025E-04  0.000E+00<br>
+1.250E-02  1.398E+01  6.602E-03  1.399E+01  1.131E-03  3.596E-04  0.000E+00<br>
+</pre></body></html>"""
 
 
 class TestStar(unittest.TestCase):
@@ -45,6 +53,46 @@ class TestStar(unittest.TestCase):
                 self.assertAlmostEqual(x[4] / 2, y[4])
                 self.assertAlmostEqual(x[4] / 2.6989, z[4])  # The Aluminium density in the website
 
+    def test_iter_star(self):
+        # Parse a fixed ESTAR page, stopping after the first row
+        previous = scheduler.get_scheduler()
+        page_scheduler = PageScheduler(_ESTAR_PAGE)
+        scheduler.set_scheduler(page_scheduler)
+        try:
+            rows = star.iter_star(13, "e", density=True)
+            self.assertEqual(page_scheduler.responses, [])  # Nothing is requested until the rows are needed
+            first = next(rows)
+            self.assertEqual(first, [1.0E-02, 1.649E+01 * 2.699, 6.559E-03 * 2.699, 1.650E+01 * 2.699,
+                                     7.711E-04 / 2.699, 3.025E-04, 0.0])
+            self.assertFalse(page_scheduler.responses[0].closed)
+            rows.close()
+            # The connection is released although the table was not fully read
+            self.assertTrue(page_scheduler.responses[0].closed)
+            self.assertEqual(len(list(star.iter_star(13, "e"))), 2)
+            self.assertTrue(page_scheduler.responses[1].closed)
+        finally:
+            scheduler.set_scheduler(previous)
+
+    def test_fetch_star_energies(self):
+        # Asking for the default energies reproduces the default table, also when split in several chunks (PSTAR and
+        # ASTAR default grids exceed STAR_ENERGIES_PER_REQUEST)
+        for f in [star.fetch_estar, star.fetch_astar, star.fetch_pstar]:
+            default = f(13)
+            energies = [row[0] for row in default]
+            custom = f(13, energies=energies)
+            self.assertEqual(len(custom), len(default))
+            for x, y in zip(default, custom):
+                for a, b in zip(x, y):
+                    self.assertAlmostEqual(a, b)
+            self.assertEqual(f(13, density=True, energies=energies[:3]), f(13, density=True)[:3])
+
+    def test_shared_grid(self):
+        # Tables on the default grid share the energies
+        al, pb = star.fetch_pstar(13), star.fetch_pstar(82, density=True)
+        self.assertTrue(all(x[0] is y[0] for x, y in zip(al, pb)))
+        self.assertTrue(grids.grid_of(al) is grids.grid_of(pb))
+        self.assertEqual(list(grids.grid_of(al)), [row[0] for row in al])
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,38 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+TestStopping.py: Tests for the `stopping` module.
+"""
+
+import unittest
+
+import numpy as np
+
+from physdata import stopping
+from synthetic import assert_rows_match, estar_table
+
+
+class TestStopping(unittest.TestCase):
+    def test_synthetic(self):
+        energies = np.logspace(-1, 1, 30)
+        spectra = np.random.rand(10, len(energies))
+        ratios = stopping.stopping_power_ratios(energies, spectra, [estar_table(2.0), estar_table(0.5)],
+                                                reference=estar_table(1.0))
+        self.assertEqual(ratios.shape, (10, 2))
+        self.assertTrue(np.allclose(ratios, [[2.0, 0.5]]))
+
+    def test_batch(self):
+        energies = np.logspace(-1, 1, 50)
+        spectra = np.random.rand(20, len(energies))
+        calculator = stopping.StoppingPowerRatios(energies, [104, stopping.WATER], differential=True)
+        ratios = calculator.ratios(spectra)
+        self.assertEqual(ratios.shape, (20, 2))
+        assert_rows_match(self, calculator.ratios, spectra, ratios)
+        self.assertTrue(np.allclose(ratios[:, 1], 1.0))
+        # The water to air ratio is about 1.13 for MeV electrons
+        self.assertTrue(np.all((1 / ratios[:, 0] > 1.08) & (1 / ratios[:, 0] < 1.18)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -25,6 +25,28 @@ class TestXray(unittest.TestCase):
         # Check a compound
         self.assertTrue(type(xray.fetch_coefficients("tissue")) is list)
 
+    def test_iter_coefficients(self):
+        # The streamed rows must match the fetched table
+        self.assertEqual(list(xray.iter_coefficients(13)), xray.fetch_coefficients(13))
+        self.assertEqual(list(xray.iter_coefficients("water", 1.5)), xray.fetch_coefficients("water", 1.5))
+        self.assertEqual(list(xray.iter_coefficients(4, border_separation=None)),
+                         xray.fetch_coefficients(4, border_separation=None))
+
+    def test_coefficient_table(self):
+        table = xray.fetch_coefficient_table(82)
+        # Exact energies are kept and the legacy format can be recovered
+        self.assertEqual(table.to_list(), xray.fetch_coefficients(82))
+        self.assertEqual(table.to_list(None), xray.fetch_coefficients(82, border_separation=None))
+        # Lead has K, L and M edges
+        self.assertTrue(len(table.edges) > 3)
+        self.assertEqual(len(table.segments), len(table.edges) + 1)
+        self.assertEqual(table.edges.energies, sorted(table.edges.energies))
+        k_edge = table.edges.energies[-1]
+        self.assertEqual(table.edges.find(k_edge), len(table.edges) - 1)
+        self.assertEqual(table.edges.segment(k_edge), len(table.edges))
+        self.assertEqual(table.segment_rows(k_edge)[0][1:], table.edges.above[-1])
+        self.assertTrue(table.edges.above[-1][0] > table.edges.below[-1][0])
+        self.assertEqual(list(table.edges.between(k_edge, 1E9)), [])
 
     def test_material_lists(self):
         elements = xray.fetch_elements()
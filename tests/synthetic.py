@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+
+"""
+synthetic.py: Tables in the formats of the fetch functions built from simple laws and a scheduler serving fixed pages,
+for the tests that can run without the website, and checks shared by the tests of the batch calculators.
+"""
+
+import numpy as np
+
+from physdata import scheduler
+
+
+def xray_table(scale, constant=0.1):
+    # A table in the format of fetch_coefficients with mu/rho = scale * E^-2.5 + constant and mu_en/rho = scale * E^-2.5
+    energies = np.logspace(-3, 1, 60)
+    return np.column_stack([energies, scale * energies ** -2.5 + constant, scale * energies ** -2.5]).tolist()
+
+
+def estar_table(scale):
+    # A table in the format of fetch_estar with a collision stopping power scale / E
+    energies = np.logspace(-2, 3, 81)
+    rows = np.ones((len(energies), 7))
+    rows[:, 0] = energies
+    rows[:, 1] = scale / energies
+    return rows.tolist()
+
+
+def pstar_table(a=0.0022, p=1.75, detour=0.998):
+    # A table in the format of fetch_pstar whose CSDA range follows the Bragg-Kleeman rule a * E^p
+    energies = np.logspace(-3, 4, 100)
+    ranges = a * energies ** p
+    stopping = 1 / (a * p * energies ** (p - 1))
+    return np.column_stack([energies, stopping, stopping * 1E-3, stopping, ranges, ranges * detour,
+                            np.full_like(energies, detour)]).tolist()
+
+
+def assert_rows_match(test, function, inputs, batch):
+    # Each row of a batch result must be the result of the function for the corresponding input alone
+    test.assertEqual(len(inputs), len(batch))
+    for x, row in zip(inputs, batch):
+        test.assertTrue(np.allclose(function(x), row))
+
+
+class PageResponse:
+    # A streamed response with a fixed page, recording whether it was closed
+    def __init__(self, text):
+        self.text = text
+        self.encoding = "utf-8"
+        self.closed = False
+
+    def iter_lines(self, decode_unicode=False):
+        for line in self.text.splitlines():
+            yield line
+
+    def close(self):
+        self.closed = True
+
+
+class PageScheduler(scheduler.Scheduler):
+    # A scheduler answering every request with the same page, keeping the responses
+    def __init__(self, text):
+        scheduler.Scheduler.__init__(self)
+        self.text = text
+        self.responses = []
+
+    def request(self, method, url, **kwargs):
+        self.responses.append(PageResponse(self.text))
+        return self.responses[-1]